@@ -110,6 +110,9 @@ fixed_step_size = dates["step_size"].total_seconds()
 propagation_start_date = simulation_start_date
 propagation_end_date = propagation_start_date + propagation_duration
 
+# Create the state store
+create_state_store("states", all_spacecraft_names)
+
 # Propagation loop
 for propagation_number in tqdm(
     range(
@@ -165,23 +168,15 @@ for propagation_number in tqdm(
     # Extract the resulting state history and convert it to a ndarray
     states = dynamics_simulator.state_history
     states_array = result2array(states)
-    states_dataframe = pd.DataFrame(states_array)
 
     dependent_variables_history = dynamics_simulator.dependent_variable_history
     sun_direction = result2array(dependent_variables_history)
     sun_direction = sun_direction / np.linalg.norm(sun_direction, axis=1, keepdims=True)
-    sun_direction_dataframe = pd.DataFrame(sun_direction)
 
-    # Export results to files
-    makedirs(f"states/{propagation_number}", exist_ok=True)
-    sun_direction_dataframe.iloc[:, 1:4].to_pickle(
-        f"states/{propagation_number}/sun_direction.pkl"
+    # Export results to the state store
+    append_state_chunk(
+        "states", states_array[:, 0], states_array[:, 1:], sun_direction[:, 1:4]
     )
-    states_dataframe.iloc[:, 0].to_pickle(f"states/{propagation_number}/epochs.pkl")
-    for sat in enumerate(all_spacecraft_names):
-        states_dataframe.iloc[:, (sat[0] * 6 + 1) : (sat[0] * 6 + 7)].to_pickle(
-            f"states/{propagation_number}/{sat[1]}.pkl"
-        )
 
     # Update initial state
     initial_state = states_array[-1, 1:]
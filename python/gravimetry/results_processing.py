@@ -1,21 +1,9 @@
-import pandas as pd
-from os import listdir
+from useful_functions.state_store import get_state_store_index, get_lazy_results_dict
 
 
-def get_list_of_contents(path):
-    return [file.split(".")[0] for file in listdir(path)]
+def get_number_of_chunks(path):
+    return len(get_state_store_index(path)["chunks"])
 
 
-def get_results_dict(path):
-    files = get_list_of_contents(path)
-    results_dict = {}
-    for file in files:
-        results_dict[file] = pd.read_pickle(f"{path}/{file}.pkl")
-        column_names = ["x", "y", "z", "vx", "vy", "vz"]
-        if file != "epochs":
-            columns = {}
-            for column in enumerate(list(results_dict[file].columns)):
-                columns[column[1]] = column_names[column[0]]
-
-            results_dict[file].rename(columns=columns, inplace=True)
-    return results_dict
+def get_results_dict(path, chunk):
+    return get_lazy_results_dict(path, chunk=chunk)
@@ -1,244 +1,88 @@
-import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
 from attitude.sun_pointing_rotation import compute_body_vectors
-from results_processing import get_list_of_contents, get_results_dict
-from useful_functions import date_transformations as dt
-from useful_functions import get_spacecraft
-from useful_functions.constants import SPEED_OF_LIGHT
-
-Tolosat = get_spacecraft("Tolosat")
-Glonass = get_spacecraft("Glonass")
-
-f0 = 1621.25e6  # Hz
-delta_f_limit = 37500  # Hz doppler shift max +/-
-delta_f_dot_limit = 350  # 375 # Hz/s doppler rate max +/-
-max_distance = 20000e3  # [m] max distance to establish communication between Tolosat and glonass
-semi_angle_limit_tolosat = Tolosat[
-    "glonass_antenna_half_angle"
-]  # deg semi-angle visibility
-semi_angle_limit_glonass = Glonass["antenna_half_angle"]  # deg semi-angle visibility
-glonass_antennas_location = "pmZ"  # "pmX", "pmY" or "pmZ"
+from results_processing import get_number_of_chunks, get_results_dict
+from useful_functions.link_analysis import compute_link_visibility, get_link_profile
+from useful_functions.results_store import (
+    append_results,
+    create_results_store,
+    read_results,
+)
+from useful_functions.windows import WindowAccumulator, WindowStatistics
+
+glonass_antennas = ("+Z",)  # ("+X", "-X"), ("+Y", "-Y"), ("+Z",) or ("+Z", "-Z")
 
 selected_glonass = "COSMOS 2433 (720)"
 
 selected_glonass_nospace = selected_glonass.replace(" ", "_")
 
+# Frequency, Doppler limits and antenna half-angles from input_data/spacecraft
+glonass_profile = get_link_profile(
+    "Glonass", antennas=glonass_antennas, selected_satellite=selected_glonass
+)
+
+# Samples between two evaluations of the link conditions, refined around the visibility changes
+# (None to evaluate them at every sample). A coarse evaluation misses the links visible, or hidden,
+# for less than coarse_step samples, e.g. when grazing the Earth limb or the cone of an antenna
+coarse_step = None
 
-# pointage zenith // pointage soleil ??
+# Passes crossing the end of a chunk are merged with the next chunk
+window_accumulators = {"Glonass": WindowAccumulator()}
 
 
 def compute_doppler_visibility(results_dict):
-    sun_directions = results_dict["sun_direction"].to_numpy()
-    epochs = results_dict["epochs"].to_numpy()
-    pX_vector, pY_vector, pZ_vector = compute_body_vectors(epochs, sun_directions)
-    if glonass_antennas_location == "pmX":
-        glonass_antenna_1_vector = pX_vector
-        glonass_antenna_2_vector = -pX_vector
-    elif glonass_antennas_location == "pmY":
-        glonass_antenna_1_vector = pY_vector
-        glonass_antenna_2_vector = -pY_vector
-    elif glonass_antennas_location == "pmZ":    # 1 antenna in the Z direction
-        glonass_antenna_1_vector = pZ_vector
-        glonass_antenna_2_vector = None
-    else:
-        raise ValueError("glonass_antennas_location must be pmX or pmY")
-    visibility = [results_dict["epochs"].copy().rename("epochs")]
-    sat_results = [results_dict["epochs"].copy().rename("epochs")]
-    for sat in tqdm(
-        results_dict, ncols=80, desc=f"Satellites", position=1, leave=False
-    ):
-        if "COSMOS" not in sat:
-            continue
-        else:
-            glonass_position = results_dict[sat][["x", "y", "z"]].to_numpy()
-            dx = (results_dict[sat]["x"] - results_dict["Tolosat"]["x"]).to_numpy()
-            dy = (results_dict[sat]["y"] - results_dict["Tolosat"]["y"]).to_numpy()
-            dz = (results_dict[sat]["z"] - results_dict["Tolosat"]["z"]).to_numpy()
-            results_dict[sat]["dx"] = dx
-            results_dict[sat]["dy"] = dy
-            results_dict[sat]["dz"] = dz
-            relative_position = np.array([dx, dy, dz]).T
-
-            dv_x = (results_dict[sat]["vx"] - results_dict["Tolosat"]["vx"]).to_numpy()
-            dv_y = (results_dict[sat]["vy"] - results_dict["Tolosat"]["vy"]).to_numpy()
-            dv_z = (results_dict[sat]["vz"] - results_dict["Tolosat"]["vz"]).to_numpy()
-            results_dict[sat]["dv_x"] = dv_x
-            results_dict[sat]["dv_y"] = dv_y
-            results_dict[sat]["dv_z"] = dv_z
-            relative_velocity = np.array([dv_x, dv_y, dv_z]).T
-            dv = np.sqrt(dv_x**2 + dv_y**2 + dv_z**2)
-            results_dict[sat]["dv"] = dv
-
-            theta_r = np.arccos(
-                np.sum(relative_position * relative_velocity, axis=1)
-                / (
-                    np.linalg.norm(relative_position, axis=1)
-                    * np.linalg.norm(relative_velocity, axis=1)
-                )
-            )
-            results_dict[sat]["theta_r_deg"] = np.deg2rad(theta_r)
-            beta = dv / SPEED_OF_LIGHT
-            gamma = 1 / np.sqrt(1 - beta**2)
-
-            results_dict[sat]["doppler_shift"] = f0 * (
-                1 / (gamma * (1 + beta * np.cos(theta_r))) - 1
-            )
-            results_dict[sat]["doppler_rate"] = np.gradient(
-                results_dict[sat]["doppler_shift"], results_dict["epochs"]
-            )
-
-            tolosat_angle_1 = np.arccos(
-                np.sum(relative_position * glonass_antenna_1_vector, axis=1)
-                / (
-                    np.linalg.norm(relative_position, axis=1)
-                    * np.linalg.norm(glonass_antenna_1_vector, axis=1)
-                )
-            )
-            results_dict[sat]["tolosat_angle_1"] = np.rad2deg(tolosat_angle_1)
-            if glonass_antenna_2_vector is not None:
-                tolosat_angle_2 = np.arccos(
-                    np.sum(relative_position * glonass_antenna_2_vector, axis=1)
-                    / (
-                        np.linalg.norm(relative_position, axis=1)
-                        * np.linalg.norm(glonass_antenna_2_vector, axis=1)
-                    )
-                )
-                results_dict[sat]["tolosat_angle_2"] = np.rad2deg(tolosat_angle_2)
-
-            glonass_angle = np.arccos(
-                np.sum(relative_position * glonass_position, axis=1)
-                / (
-                    np.linalg.norm(relative_position, axis=1)
-                    * np.linalg.norm(glonass_position, axis=1)
-                )
-            )
-            results_dict[sat]["glonass_angle"] = np.rad2deg(glonass_angle)
-
-            results_dict[sat]["doppler_shift_OK"] = (
-                np.abs(results_dict[sat]["doppler_shift"]) <= delta_f_limit
-            )
-            results_dict[sat]["doppler_rate_OK"] = (
-                np.abs(results_dict[sat]["doppler_rate"]) <= delta_f_dot_limit
-            )
-            results_dict[sat]["tolosat_visibility_OK"] = (
-                    results_dict[sat]["tolosat_angle_1"] <= semi_angle_limit_tolosat
-            )
-
-            if glonass_antenna_2_vector is not None:
-                results_dict[sat]["tolosat_visibility_OK"] |= (
-                        results_dict[sat]["tolosat_angle_2"] <= semi_angle_limit_tolosat
-                )
-            results_dict[sat]["glonass_visibility_OK"] = (
-                    results_dict[sat]["glonass_angle"] <= semi_angle_limit_glonass
-            )
-
-            results_dict[sat]["glonass_visibility_OK"] = (
-                    results_dict[sat]["glonass_angle"] <= semi_angle_limit_glonass
-            )
-
-            dist = np.sqrt(dx ** 2 + dy ** 2 + dz ** 2)
-            results_dict[sat]["distance_OK"] = (
-                    dist <= max_distance  # Maximum distance to establish communication
-            )
-
-            results_dict[sat]["all_OK"] = (
-                results_dict[sat]["doppler_shift_OK"]
-                & results_dict[sat]["doppler_rate_OK"]
-                & results_dict[sat]["tolosat_visibility_OK"]
-                & results_dict[sat]["glonass_visibility_OK"]
-                & results_dict[sat]["distance_OK"]
-            )
-
-            if sat == selected_glonass:
-                sat_results.append(results_dict[sat]["tolosat_angle_1"])
-                if glonass_antenna_2_vector is not None:
-                    sat_results.append(results_dict[sat]["tolosat_angle_2"])
-                sat_results.append(results_dict[sat]["glonass_angle"])
-                sat_results.append(results_dict[sat]["doppler_shift"])
-                sat_results.append(results_dict[sat]["doppler_rate"])
-            visibility.append(results_dict[sat]["all_OK"].rename(sat))
-
-        if results_dict[sat]["all_OK"].any():
-            print(f"{sat} OK")
-
-    sat_results = pd.concat(sat_results, axis=1)
-    visibility = pd.concat(visibility, axis=1)
-    visibility["sum_ok"] = visibility.select_dtypes(include=["bool"]).sum(axis=1)
-    results_dict["datetime"] = dt.epoch_to_datetime(results_dict["epochs"])
-    results_dict["timedelta"] = results_dict["datetime"] - results_dict["datetime"][0]
-    windows = visibility.copy()
-    visibility = visibility[visibility["sum_ok"] > 0]
-    windows["bool"] = windows["sum_ok"] > 0
-
-    # Code steps from https://joshdevlin.com/blog/calculate-streaks-in-pandas/
-    windows["start_bool"] = windows["bool"].ne(windows["bool"].shift(1))
-    windows["end_bool"] = windows["bool"].ne(windows["bool"].shift(-1))
-    windows["streak_id"] = windows["start_bool"].cumsum()
-
-    windows.loc[windows["start_bool"], "start"] = windows["epochs"]
-    windows["start"] = windows["start"].fillna(method="ffill")
-    windows = windows[windows["end_bool"]]
-    windows = windows.rename({"epochs": "end", "bool": "eclipse"}, axis=1)
-    windows = windows[["eclipse", "start", "end"]]
-    windows = windows[windows["eclipse"]].drop("eclipse", axis=1)
-    windows.rename({"start": "start_epoch", "end": "end_epoch"}, axis=1, inplace=True)
-    windows["start"] = dt.epoch_to_datetime(windows["start_epoch"])
-    windows["end"] = dt.epoch_to_datetime(windows["end_epoch"])
-    windows["duration"] = windows["end_epoch"] - windows["start_epoch"]
-    windows.drop(["start_epoch", "end_epoch"], axis=1, inplace=True)
-    windows = windows.reset_index(drop=True)
-    return visibility, windows, sat_results
-
-
-# Initialize DataFrames
-glonass_visibility = pd.DataFrame(columns=[])
-glonass_windows = pd.DataFrame(columns=[])
-glonass_sat_results = pd.DataFrame(columns=[])
-
-folders = get_list_of_contents("glonass_states")
-folders = [int(x) for x in folders]
-folders.sort()
-
-print(f"Starting Doppler processing of {len(folders)} datasets...")
-for folder in tqdm(folders, ncols=80, desc="Datasets", position=0, leave=True):
-    results = get_results_dict(f"glonass_states/{folder}")
+    body_vectors = compute_body_vectors(
+        results_dict["epochs"].to_numpy(), results_dict["sun_direction"].to_numpy()
+    )
+    return compute_link_visibility(
+        results_dict,
+        body_vectors,
+        [glonass_profile],
+        window_accumulators,
+        coarse_step=coarse_step,
+    )["Glonass"]
+
+
+# Rows of each chunk are written to a results store, statistics are updated on the fly
+results_store = "glonass_doppler_results"
+create_results_store(results_store)
+glonass_windows = []
+glonass_window_statistics = WindowStatistics()
+
+chunks = range(get_number_of_chunks("glonass_states"))
+
+print(f"Starting Doppler processing of {len(chunks)} datasets...")
+for chunk in tqdm(chunks, ncols=80, desc="Datasets", position=0, leave=True):
+    results = get_results_dict("glonass_states", chunk)
     tmp_visibility, tmp_windows, tmp_sat_results = compute_doppler_visibility(results)
-    glonass_visibility = pd.concat([glonass_visibility, tmp_visibility], ignore_index=True)
-    glonass_windows = pd.concat([glonass_windows, tmp_windows], ignore_index=True)
-    glonass_sat_results = pd.concat([glonass_sat_results, tmp_sat_results], ignore_index=True)
+    append_results(results_store, "visibility", tmp_visibility)
+    append_results(results_store, "sat_results", tmp_sat_results)
+    glonass_windows.append(tmp_windows)
+    glonass_window_statistics.add(tmp_windows)
 
-glonass_sat_results["seconds"] = glonass_sat_results["epochs"] - glonass_sat_results["epochs"][0]
+# Pass still open at the end of the mission
+glonass_windows.append(window_accumulators["Glonass"].finish())
+glonass_window_statistics.add(glonass_windows[-1])
 
-glonass_windows = glonass_windows[glonass_windows["duration"] > 0]
+glonass_windows = pd.concat(glonass_windows, ignore_index=True)
+glonass_visibility = read_results(results_store, "visibility")
+glonass_sat_results = read_results(results_store, "sat_results")
 
-if 0 in glonass_windows["start"].index:
-    glonass_windows["timedelta"] = glonass_windows["start"] - glonass_windows["start"][0]
-    glonass_windows["seconds"] = glonass_windows["timedelta"].dt.total_seconds()
-    glonass_visibility["seconds"] = (
-            glonass_visibility["epochs"] - glonass_visibility["epochs"][0]
-    )
-else:
-    # Handle the case where the key does not exist
-    print("Key 0 does not exist in the DataFrame.")
-    glonass_windows["timedelta"] = 0
-    glonass_windows["seconds"] = 0
-    glonass_visibility["seconds"] = 0
-
-glonass_windows["timedelta"] = glonass_windows["start"] - glonass_windows["start"][0]
-glonass_windows["seconds"] = glonass_windows["timedelta"].dt.total_seconds()
-glonass_visibility["seconds"] = glonass_visibility["epochs"] - glonass_visibility["epochs"][0]
-print(f"Minimum glonass window duration: {glonass_windows['duration'].min()} seconds")
-print(f"Maximum glonass window duration: {glonass_windows['duration'].max()} seconds")
-print(f"Average glonass window duration: {glonass_windows['duration'].mean()} seconds")
-print(
-    f"Average glonass passes per day: {len(glonass_windows) / glonass_windows['seconds'].max() * 86400:.2f} passes"
+glonass_sat_results["seconds"] = (
+    glonass_sat_results["epochs"] - glonass_sat_results["epochs"].min()
 )
-print(
-    f"Average glonass visibility per day: "
-    f"{glonass_windows['duration'].sum() / glonass_windows['seconds'].max() * 86400:.2f} seconds"
+
+glonass_windows = glonass_windows[glonass_windows["duration"] > 0].reset_index(
+    drop=True
 )
+glonass_windows["timedelta"] = glonass_windows["start"] - glonass_windows["start"].min()
+glonass_windows["seconds"] = glonass_windows["timedelta"].dt.total_seconds()
+glonass_visibility["seconds"] = (
+    glonass_visibility["epochs"] - glonass_visibility["epochs"].min()
+)
+
+glonass_window_statistics.print_summary("glonass")
 
 glonass_visibility.to_csv("results/glonass_visibility.csv")
 glonass_windows.to_csv("results/glonass_windows.csv")
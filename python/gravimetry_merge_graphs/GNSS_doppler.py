@@ -0,0 +1,100 @@
+# This script computes the visibility of the GPS, Galileo and Glonass constellations in a single pass over the
+# propagation chunks. TOLOSAT states and attitude are shared by the three constellations and only computed once.
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from attitude.sun_pointing_rotation import compute_body_vectors
+from useful_functions.link_analysis import compute_link_visibility, get_link_profile
+from useful_functions.results_store import (
+    append_results,
+    create_results_store,
+    read_results,
+)
+from useful_functions.state_store import get_lazy_results_dict, get_state_store_index
+from useful_functions.windows import WindowAccumulator, WindowStatistics
+
+selected_gps = "GPS BIIR-13 (PRN 02)"
+selected_galileo = "GSAT0101 (GALILEO-PFM)"
+selected_glonass = "COSMOS 2433 (720)"
+
+selected_gps_nospace = selected_gps.replace(" ", "_")
+selected_galileo_nospace = selected_galileo.replace(" ", "_")
+selected_glonass_nospace = selected_glonass.replace(" ", "_")
+
+profiles = [
+    get_link_profile("GPS", selected_satellite=selected_gps),
+    get_link_profile("Galileo", selected_satellite=selected_galileo),
+    get_link_profile("Glonass", selected_satellite=selected_glonass),
+]
+
+# Samples between two evaluations of the link conditions, refined around the visibility changes
+# (None to evaluate them at every sample). A coarse evaluation misses the links visible, or hidden,
+# for less than coarse_step samples, e.g. when grazing the Earth limb or the cone of an antenna
+coarse_step = None
+
+stores = {"GPS": "gps_states", "Galileo": "galileo_states", "Glonass": "glonass_states"}
+
+chunks = range(
+    min(len(get_state_store_index(store)["chunks"]) for store in stores.values())
+)
+window_accumulators = {profile["name"]: WindowAccumulator() for profile in profiles}
+
+# Rows of each chunk are written to a results store, statistics are updated on the fly
+results_store = "gnss_doppler_results"
+create_results_store(results_store)
+windows = {profile["name"]: [] for profile in profiles}
+window_statistics = {profile["name"]: WindowStatistics() for profile in profiles}
+
+print(f"Starting Doppler processing of {len(chunks)} datasets...")
+for chunk in tqdm(chunks, ncols=80, desc="Datasets", position=0, leave=True):
+    # TOLOSAT and the Sun direction are taken from the GPS store
+    results_dict = get_lazy_results_dict(stores["GPS"], chunk)
+    for profile in profiles[1:]:
+        constellation_dict = get_lazy_results_dict(stores[profile["name"]], chunk)
+        if not np.array_equal(constellation_dict["epochs"], results_dict["epochs"]):
+            raise ValueError(
+                f"The epochs of chunk {chunk} differ between {stores['GPS']} and "
+                f"{stores[profile['name']]}, propagate them over the same dates"
+            )
+        for sat in constellation_dict:
+            if profile["keyword"] in sat:
+                results_dict[sat] = constellation_dict[sat]
+    body_vectors = compute_body_vectors(
+        results_dict["epochs"].to_numpy(), results_dict["sun_direction"].to_numpy()
+    )
+    links = compute_link_visibility(
+        results_dict, body_vectors, profiles, window_accumulators, coarse_step
+    )
+    for name, (tmp_visibility, tmp_windows, tmp_sat_results) in links.items():
+        append_results(results_store, f"{name.lower()}_visibility", tmp_visibility)
+        append_results(results_store, f"{name.lower()}_sat_results", tmp_sat_results)
+        windows[name].append(tmp_windows)
+        window_statistics[name].add(tmp_windows)
+
+
+def merge_results(name):
+    # Pass still open at the end of the mission
+    windows[name].append(window_accumulators[name].finish())
+    window_statistics[name].add(windows[name][-1])
+
+    all_windows = pd.concat(windows[name], ignore_index=True)
+    visibility = read_results(results_store, f"{name.lower()}_visibility")
+    sat_results = read_results(results_store, f"{name.lower()}_sat_results")
+
+    sat_results["seconds"] = sat_results["epochs"] - sat_results["epochs"].min()
+    all_windows = all_windows[all_windows["duration"] > 0].reset_index(drop=True)
+    all_windows["timedelta"] = all_windows["start"] - all_windows["start"].min()
+    all_windows["seconds"] = all_windows["timedelta"].dt.total_seconds()
+    visibility["seconds"] = visibility["epochs"] - visibility["epochs"].min()
+
+    window_statistics[name].print_summary(name)
+    return visibility, all_windows, sat_results
+
+
+gps_visibility, gps_windows, gps_sat_results = merge_results("GPS")
+galileo_visibility, galileo_windows, galileo_sat_results = merge_results("Galileo")
+glonass_visibility, glonass_windows, glonass_sat_results = merge_results("Glonass")
+
+print("Done")
@@ -4,9 +4,9 @@
 
 import pandas as pd
 from useful_functions import plot_functions as pf
-from gravimetry.gps_doppler import gps_sat_results, gps_visibility, gps_windows, selected_gps, selected_gps_nospace
-from gravimetry_glonass.glonass_doppler import glonass_sat_results, glonass_visibility, glonass_windows, selected_glonass, selected_glonass_nospace
-from gravimetry_galileo.galileo_doppler import galileo_sat_results, galileo_visibility, galileo_windows, selected_galileo, selected_galileo_nospace
+from GNSS_doppler import gps_sat_results, gps_visibility, gps_windows, selected_gps, selected_gps_nospace
+from GNSS_doppler import glonass_sat_results, glonass_visibility, glonass_windows, selected_glonass, selected_glonass_nospace
+from GNSS_doppler import galileo_sat_results, galileo_visibility, galileo_windows, selected_galileo, selected_galileo_nospace
 
 def plots(flag):
     if flag == 1:
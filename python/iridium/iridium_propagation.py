@@ -4,15 +4,13 @@ from tudatpy.kernel.interface import spice
 from tudatpy.kernel.numerical_simulation import environment_setup, propagation_setup
 from tudatpy.util import result2array
 
-from iridium_TLE_sync import iridium_states_synced, iridium_names
+from iridium_TLE_sync import iridium_catalogue, iridium_names
 from useful_functions import *
+from useful_functions.tle_catalogue import propagate_catalogue, sync_catalogue
 
 # Load spice kernels
 spice.load_standard_kernels([])
 
-# Isolate states
-iridium_all_states = iridium_states_synced[["x", "y", "z", "vx", "vy", "vz"]].to_numpy()
-
 # Get input data
 dates_name = "1year_1sec_iter"
 spacecraft_name = "Tolosat"
@@ -36,6 +34,15 @@ body_settings = environment_setup.get_default_body_settings(
 )
 bodies = environment_setup.create_system_of_bodies(body_settings)
 
+# Ephemerides of the Iridium satellites: "sgp4" evaluates their TLEs at each epoch and
+# only Tolosat is integrated, "numerical" integrates them with Tolosat from their
+# TLE states at the simulation start
+iridium_ephemeris = "sgp4"
+
+# Numerical runs also save their states to this store, to which SGP4 runs are compared
+# on the same dates (maximum and RMS position differences of each satellite)
+reference_store = "iridium_states_numerical"
+
 # Define list of Iridium satellites and the acceleration model to be used
 all_spacecraft_names = ["Tolosat"] + iridium_names
 
@@ -61,9 +68,10 @@ bodies.create_empty_body("Tolosat")
 bodies.get("Tolosat").mass = Tolosat["mass"]
 
 # Create bodies to propagate and define their acceleration settings
-for spacecraft in iridium_names:
-    bodies.create_empty_body(spacecraft)
-    acceleration_settings[spacecraft] = acceleration_settings_iridium
+if iridium_ephemeris == "numerical":
+    for spacecraft in iridium_names:
+        bodies.create_empty_body(spacecraft)
+        acceleration_settings[spacecraft] = acceleration_settings_iridium
 
 # Create aerodynamic coefficient interface settings, and add to vehicle
 Tolosat_aero_settings = environment_setup.aerodynamic_coefficients.constant(
@@ -82,8 +90,11 @@ environment_setup.add_radiation_pressure_interface(
 )
 
 # Define bodies that are propagated and their respective central bodies
-bodies_to_propagate = all_spacecraft_names
-central_bodies = ["Earth"] * len(all_spacecraft_names)
+if iridium_ephemeris == "numerical":
+    bodies_to_propagate = all_spacecraft_names
+else:
+    bodies_to_propagate = ["Tolosat"]
+central_bodies = ["Earth"] * len(bodies_to_propagate)
 
 # Create acceleration models
 acceleration_models = propagation_setup.create_acceleration_models(
@@ -104,7 +115,15 @@ Tolosat_initial_state = element_conversion.keplerian_to_cartesian_elementwise(
     true_anomaly=np.deg2rad(Tolosat_orbit["true_anomaly"]),
 )
 
-initial_state = Tolosat_initial_state.tolist() + iridium_all_states.flatten().tolist()
+initial_state = Tolosat_initial_state.tolist()
+if iridium_ephemeris == "numerical":
+    iridium_states_start = sync_catalogue(
+        iridium_catalogue, sync_epoch=datetime_to_epoch(simulation_start_date)
+    )
+    iridium_all_states = iridium_states_start[
+        ["x", "y", "z", "vx", "vy", "vz"]
+    ].to_numpy()
+    initial_state += iridium_all_states.flatten().tolist()
 
 # Setup dependent variables
 sun_direction_dep_var = propagation_setup.dependent_variable.relative_position(
@@ -119,6 +138,11 @@ fixed_step_size = dates["step_size"].total_seconds()
 propagation_start_date = simulation_start_date
 propagation_end_date = propagation_start_date + propagation_duration
 
+# Create the state stores
+create_state_store("iridium_states", all_spacecraft_names)
+if iridium_ephemeris == "numerical":
+    create_state_store(reference_store, all_spacecraft_names)
+
 # Propagation loop
 for propagation_number in tqdm(
     range(
@@ -174,31 +198,43 @@ for propagation_number in tqdm(
     # Extract the resulting state history and convert it to a ndarray
     states = dynamics_simulator.state_history
     states_array = result2array(states)
-    states_dataframe = pd.DataFrame(states_array)
 
     dependent_variables_history = dynamics_simulator.dependent_variable_history
     sun_direction = result2array(dependent_variables_history)
     sun_direction = sun_direction / np.linalg.norm(sun_direction, axis=1, keepdims=True)
-    sun_direction_dataframe = pd.DataFrame(sun_direction)
 
-    # Export results to files
-    makedirs(f"iridium_states/{propagation_number}", exist_ok=True)
-    sun_direction_dataframe.iloc[:, 1:4].to_pickle(
-        f"iridium_states/{propagation_number}/sun_direction.pkl"
-    )
-    states_dataframe.iloc[:, 0].to_pickle(
-        f"iridium_states/{propagation_number}/epochs.pkl"
+    # Add the states of the Iridium satellites after those of Tolosat
+    if iridium_ephemeris == "sgp4":
+        iridium_states = propagate_catalogue(iridium_catalogue, states_array[:, 0])
+        iridium_states = iridium_states.transpose(1, 0, 2).reshape(
+            len(states_array), -1
+        )
+        states_array = np.column_stack((states_array, iridium_states))
+
+    # Export results to the state store
+    append_state_chunk(
+        "iridium_states", states_array[:, 0], states_array[:, 1:], sun_direction[:, 1:4]
     )
-    for sat in enumerate(all_spacecraft_names):
-        states_dataframe.iloc[:, (sat[0] * 6 + 1) : (sat[0] * 6 + 7)].to_pickle(
-            f"iridium_states/{propagation_number}/{sat[1]}.pkl"
+    if iridium_ephemeris == "numerical":
+        append_state_chunk(
+            reference_store,
+            states_array[:, 0],
+            states_array[:, 1:],
+            sun_direction[:, 1:4],
         )
 
     # Update initial state
-    initial_state = states_array[-1, 1:]
+    initial_state = states_array[-1, 1 : 6 * len(bodies_to_propagate) + 1]
 
     # Update propagation dates
     propagation_start_date = propagation_end_date
     propagation_end_date = propagation_start_date + propagation_duration
 
 print("Done with Iridium propagation.")
+
+# Compare the SGP4 ephemerides to the numerical ones
+if iridium_ephemeris == "sgp4" and state_stores_match(
+    "iridium_states", reference_store, iridium_names
+):
+    differences = compare_state_stores("iridium_states", reference_store, iridium_names)
+    print(differences[["max_position", "rms_position"]])
@@ -10,7 +10,7 @@ from useful_functions import plot_functions as pf
 
 # Initial settings (independent of tudat)
 orbit_name = "SSO6"
-dates_name = "10years_10sec_iter"
+dates_name = "10years_60sec_iter"
 spacecraft_name = "Tolosat"
 groundstation_name = "toulouse"
 
@@ -115,8 +115,9 @@ fixed_step_size = dates["step_size"].total_seconds()
 propagation_start_date = simulation_start_date
 propagation_end_date = propagation_start_date + propagation_duration
 
-# Initialize eclipses DataFrame
-all_eclipses = pd.DataFrame(columns=["start", "end", "duration", "partial"])
+# Eclipses crossing the end of a propagation are stitched with the next propagation
+eclipse_accumulator = WindowAccumulator()
+eclipses_list = []
 
 for propagation_number in tqdm(
     range(
@@ -179,23 +180,25 @@ for propagation_number in tqdm(
     sun_radius = bodies.get("Sun").shape_model.average_radius
     earth_radius = bodies.get("Earth").shape_model.average_radius
     satellite_position = states_array[:, 1:4]
+    satellite_velocity = states_array[:, 4:7]
     sun_position = dependent_variables_history_array[:, 1:4]
     epochs = states_array[:, 0]
 
-    # Store the eclipses results
-    eclipses = compute_eclipses(
+    # Store the eclipses results (entry and exit refined between the 60 s samples)
+    eclipses = compute_eclipse_events(
         satellite_position,
         sun_position,
         sun_radius,
         earth_radius,
-        epoch_to_datetime(epochs),
+        epochs,
         eclipse_type="Umbra",
+        satellite_velocity=satellite_velocity,
+    )
+    eclipses_list.append(
+        eclipse_accumulator.add_windows(
+            eclipses["start_epoch"], eclipses["end_epoch"], epochs[0], epochs[-1]
+        )
     )
-    if all_eclipses.empty:
-        if not eclipses.empty:
-            all_eclipses = eclipses
-    elif not all_eclipses.empty and not eclipses.empty:
-        all_eclipses = pd.concat([all_eclipses, eclipses], ignore_index=True)
 
     # Update initial conditions
     initial_state = states_array[-1, 1:7]
@@ -203,9 +206,11 @@ for propagation_number in tqdm(
     # Update propagation dates
     propagation_start_date = propagation_end_date
     propagation_end_date = propagation_start_date + propagation_duration
-all_eclipses["partial"] = all_eclipses["partial"].astype("boolean")
+eclipses_list.append(eclipse_accumulator.finish())
+all_eclipses = pd.concat(eclipses_list, ignore_index=True)
 print("Done!")
 
+# Remove the eclipses cut by the start or the end of the mission
 all_eclipses = all_eclipses[~all_eclipses["partial"]]
 all_eclipses["start"] = pd.to_datetime(all_eclipses["start"], utc=True)
 all_eclipses["timedelta"] = all_eclipses["start"] - simulation_start_date
@@ -221,12 +226,12 @@ fig, axes = pf.dark_figure()
 axes[0].vlines(
     all_eclipses["seconds"] / 86400 / 365.25,
     0,
-    all_eclipses["duration"].dt.total_seconds() / 60,
+    all_eclipses["duration"] / 60,
 )
 axes[0].set_title("Evolution of the eclipse duration over the entire mission")
 axes[0].set_xlabel("Time since launch [years]")
 axes[0].set_ylabel("Eclipse duration [mins]")
-axes[0].set_ylim(0, all_eclipses["duration"].max().total_seconds() / 60)
+axes[0].set_ylim(0, all_eclipses["duration"].max() / 60)
 axes[0].set_xlim(0, all_eclipses["seconds"].max() / 86400 / 365.25)
 pf.finish_dark_figure(fig, "all_eclipses_dark.png", show=True, force_y_int=True)
 
@@ -234,11 +239,11 @@ fig, axes = pf.light_figure()
 axes[0].vlines(
     all_eclipses["seconds"] / 86400 / 365.25,
     0,
-    all_eclipses["duration"].dt.total_seconds() / 60,
+    all_eclipses["duration"] / 60,
 )
 axes[0].set_title("Evolution of the eclipse duration over the entire mission")
 axes[0].set_xlabel("Time since launch [years]")
 axes[0].set_ylabel("Eclipse duration [mins]")
-axes[0].set_ylim(0, all_eclipses["duration"].max().total_seconds() / 60)
+axes[0].set_ylim(0, all_eclipses["duration"].max() / 60)
 axes[0].set_xlim(0, all_eclipses["seconds"].max() / 86400 / 365.25)
 pf.finish_light_figure(fig, "all_eclipses_light.png", show=True, force_y_int=True)
@@ -0,0 +1,73 @@
+# Import statements
+from pathlib import Path
+
+from useful_functions import *
+from useful_functions import plot_functions as pf
+
+# Mean keplerian elements computed with STELA in CelestLab (one set per orbit until re-entry)
+stela_path = Path(__file__).parents[2].joinpath("celestlab", "LongTermEclipses")
+stela_cjd = np.loadtxt(stela_path.joinpath("stela_datevector.csv"))
+stela_mean_kep = np.loadtxt(stela_path.joinpath("stela_mean_kep.csv"), delimiter=",")
+stela_eclipses = np.loadtxt(stela_path.joinpath("stela_eclipses.csv"))
+
+# Remove the epochs after re-entry
+valid = ~np.isnan(stela_mean_kep).any(axis=1)
+epochs = cjd_to_epoch(stela_cjd[valid])
+semi_major_axis, eccentricity, inclination, argument_of_periapsis, raan, _ = (
+    stela_mean_kep[valid].T
+)
+
+# CelestLab constants
+sun_radius = 696000e3  # m
+earth_radius = 6378136.3  # m
+earth_gravitational_parameter = 3.986004415e14  # m^3/s^2
+
+# Estimate the beta angle and the umbra duration of each orbit
+all_eclipses = compute_mean_eclipses(
+    epochs,
+    semi_major_axis,
+    inclination,
+    raan,
+    compute_sun_position(epochs),
+    sun_radius,
+    earth_radius,
+    earth_gravitational_parameter,
+    eclipse_type="Umbra",
+    eccentricity=eccentricity,
+    argument_of_periapsis=argument_of_periapsis,
+)
+all_eclipses["stela_duration"] = stela_eclipses[valid]
+all_eclipses["seconds"] = all_eclipses["epoch"] - all_eclipses["epoch"][0]
+
+duration_difference = (all_eclipses["duration"] - all_eclipses["stela_duration"]).abs()
+print(f"Median difference with CelestLab: {duration_difference.median():.2f} seconds")
+print(f"Maximum difference with CelestLab: {duration_difference.max():.2f} seconds")
+
+all_eclipses.to_csv("all_eclipses_stela.csv", index=False)
+
+fig, axes = pf.dark_figure()
+axes[0].plot(
+    all_eclipses["seconds"] / 86400 / 365.25,
+    all_eclipses["duration"] / 60,
+    ".",
+    markersize=2,
+)
+axes[0].set_title("Evolution of the eclipse duration over the entire mission")
+axes[0].set_xlabel("Time since launch [years]")
+axes[0].set_ylabel("Eclipse duration [mins]")
+axes[0].set_ylim(0, all_eclipses["duration"].max() / 60)
+axes[0].set_xlim(0, all_eclipses["seconds"].max() / 86400 / 365.25)
+pf.finish_dark_figure(fig, "all_eclipses_stela_dark.png", show=True, force_y_int=True)
+
+fig, axes = pf.dark_figure()
+axes[0].plot(
+    all_eclipses["seconds"] / 86400 / 365.25,
+    np.rad2deg(all_eclipses["beta_angle"]),
+    ".",
+    markersize=2,
+)
+axes[0].set_title("Evolution of the beta angle over the entire mission")
+axes[0].set_xlabel("Time since launch [years]")
+axes[0].set_ylabel("Beta angle [deg]")
+axes[0].set_xlim(0, all_eclipses["seconds"].max() / 86400 / 365.25)
+pf.finish_dark_figure(fig, "beta_angle_stela_dark.png", show=True)
@@ -0,0 +1,35 @@
+# Import statements
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from useful_functions import date_transformations as dt
+
+# One day of 1 second epochs, as in the daily chunks of the doppler scripts
+epochs = pd.Series(np.arange(86400.0) + 7.5e8, name="epochs")
+reference_samples = 2000
+
+# Reference: one astropy Time per element
+start = perf_counter()
+reference = epochs[:reference_samples].apply(dt.epoch_to_datetime_raw)
+reference_time = (perf_counter() - start) * len(epochs) / reference_samples
+
+# Vectorized conversion
+start = perf_counter()
+vectorized = dt.epoch_to_datetime(epochs)
+vectorized_time = perf_counter() - start
+
+if not vectorized[:reference_samples].equals(reference):
+    raise ValueError("Vectorized conversion differs from the reference conversion")
+
+# Round trip
+start = perf_counter()
+round_trip = dt.datetime_to_epoch(vectorized)
+round_trip_time = perf_counter() - start
+round_trip_error = np.max(np.abs(round_trip - epochs))
+
+print(f"Reference conversion of {len(epochs)} epochs: {reference_time:.2f} s (extrapolated)")
+print(f"Vectorized conversion of {len(epochs)} epochs: {vectorized_time:.4f} s")
+print(f"Speedup: {reference_time / vectorized_time:.0f}x")
+print(f"Round trip: {round_trip_time:.4f} s, maximum error {round_trip_error:.2e} s")
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+
+from attitude.sun_pointing_rotation import compute_body_vectors
+from useful_functions.link_analysis import compute_link_visibility, get_link_profile
+from useful_functions.state_store import STATE_COLUMNS
+from useful_functions.windows import compute_adaptive_mask
+
+EARTH_GRAVITATIONAL_PARAMETER = 3.986004418e14
+EARTH_RADIUS = 6378137.0
+
+# Half a day of 1 second epochs
+EPOCHS = np.arange(0.0, 43201.0) + 8e8
+
+
+def get_circular_states(semi_major_axis, inclination, raan, phase):
+    """States of a circular Keplerian orbit at EPOCHS, in a data frame with the columns of a state store"""
+    mean_motion = np.sqrt(EARTH_GRAVITATIONAL_PARAMETER / semi_major_axis**3)
+    u = phase + mean_motion * (EPOCHS - EPOCHS[0])
+    node = np.array([np.cos(raan), np.sin(raan), 0])
+    normal_in_plane = np.array(
+        [
+            -np.sin(raan) * np.cos(inclination),
+            np.cos(raan) * np.cos(inclination),
+            np.sin(inclination),
+        ]
+    )
+    position = np.outer(np.cos(u), node) + np.outer(np.sin(u), normal_in_plane)
+    velocity = np.outer(-np.sin(u), node) + np.outer(np.cos(u), normal_in_plane)
+    states = np.hstack(
+        (semi_major_axis * position, semi_major_axis * mean_motion * velocity)
+    )
+    return pd.DataFrame(states, columns=STATE_COLUMNS)
+
+
+def get_constellation_chunk(name, altitude, inclination, planes, satellites_per_plane):
+    """Results of a chunk with TOLOSAT on a 500 km sun-synchronous orbit and a Walker constellation"""
+    sun_direction = np.tile([0.3, 0.9, 0.2], (len(EPOCHS), 1))
+    sun_direction /= np.linalg.norm(sun_direction, axis=1, keepdims=True)
+    results_dict = {
+        "epochs": pd.Series(EPOCHS),
+        "sun_direction": pd.DataFrame(sun_direction),
+        "Tolosat": get_circular_states(
+            EARTH_RADIUS + 500e3, np.deg2rad(97.4), 0.3, 0.0
+        ),
+    }
+    for plane in range(planes):
+        for satellite in range(satellites_per_plane):
+            results_dict[f"{name} {plane}-{satellite}"] = get_circular_states(
+                EARTH_RADIUS + altitude,
+                np.deg2rad(inclination),
+                2 * np.pi * plane / planes,
+                2 * np.pi * satellite / satellites_per_plane + 0.25 * plane,
+            )
+    body_vectors = compute_body_vectors(EPOCHS, sun_direction)
+    return results_dict, body_vectors
+
+
+def test_compute_adaptive_mask_matches_full_evaluation():
+    def evaluate_mask(time_indices, column_indices):
+        return (time_indices + 7 * column_indices) % 40 < 20
+
+    mask = compute_adaptive_mask(evaluate_mask, (200, 3), 5)
+    time_indices, column_indices = np.meshgrid(
+        np.arange(200), np.arange(3), indexing="ij"
+    )
+    assert np.array_equal(mask, evaluate_mask(time_indices, column_indices))
+    assert compute_adaptive_mask(evaluate_mask, (0, 3), 5).shape == (0, 3)
+
+
+def get_visibility_mask(visibility, satellite_names):
+    """Visibility of each satellite at every epoch, from the rows of the epochs with a visible satellite"""
+    visibility = visibility.set_index("epochs").reindex(EPOCHS, fill_value=False)
+    return visibility[satellite_names].to_numpy(dtype=bool)
+
+
+def get_shortest_runs(mask):
+    """Shortest number of samples during which each column keeps its value between two changes"""
+    shortest_runs = np.full(mask.shape[1], np.inf)
+    for column in range(mask.shape[1]):
+        changes = np.flatnonzero(np.diff(mask[:, column]))
+        if len(changes) > 1:
+            shortest_runs[column] = np.diff(changes).min()
+    return shortest_runs
+
+
+def test_coarse_evaluation_matches_full_evaluation_for_long_runs():
+    # The coarse evaluation is exact for the satellites that are never visible, or hidden, for less than coarse_step
+    # samples. Passes grazing the Earth limb, an antenna cone or the maximum distance of the Iridium links are
+    # shorter and some are missed, which is why the scripts evaluate every sample by default.
+    coarse_step = 30
+    chunks = [
+        ("GPS", get_constellation_chunk("GPS", 20182e3, 55, 6, 4)),
+        ("Iridium", get_constellation_chunk("IRIDIUM", 780e3, 86.4, 6, 11)),
+    ]
+    for constellation, (results_dict, body_vectors) in chunks:
+        satellite_names = list(results_dict)[3:]
+        profile = get_link_profile(constellation, antennas=("+Z", "-Z"))
+        full = compute_link_visibility(results_dict, body_vectors, [profile])[
+            constellation
+        ]
+        coarse = compute_link_visibility(
+            results_dict, body_vectors, [profile], coarse_step=coarse_step
+        )[constellation]
+        full_mask = get_visibility_mask(full[0], satellite_names)
+        coarse_mask = get_visibility_mask(coarse[0], satellite_names)
+
+        long_runs = get_shortest_runs(full_mask) >= coarse_step
+        assert long_runs.any()
+        assert np.array_equal(coarse_mask[:, long_runs], full_mask[:, long_runs])
+        assert not np.array_equal(coarse_mask, full_mask)
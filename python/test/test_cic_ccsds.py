@@ -0,0 +1,38 @@
+import numpy as np
+
+from visualization.cic_ccsds import CIC_days_secs_to_epochs, epochs_to_CIC_days_secs
+
+# J2000 (2000-01-01 12:00:00 UTC) is day 51544 and second 43232 of the CIC reference time in TAI
+J2000_DAY = 51544
+J2000_TAI_SECONDS = 43232.0
+
+
+def test_j2000():
+    days, seconds = epochs_to_CIC_days_secs([0.0])
+    assert days.tolist() == [J2000_DAY]
+    assert seconds.tolist() == [J2000_TAI_SECONDS]
+
+    days, seconds = epochs_to_CIC_days_secs([0.0], time_scale="UTC")
+    assert days.tolist() == [J2000_DAY]
+    assert seconds.tolist() == [43200.0]
+
+
+def test_half_millisecond_ties_round_to_even():
+    # 0.0625 and 0.1875 are exact in binary, so the seconds of the day are exact ties
+    days, seconds = epochs_to_CIC_days_secs([0.0625, 0.1875])
+    assert days.tolist() == [J2000_DAY, J2000_DAY]
+    assert seconds.tolist() == [J2000_TAI_SECONDS + 0.062, J2000_TAI_SECONDS + 0.188]
+
+
+def test_rounding_to_the_end_of_the_day():
+    days, seconds = epochs_to_CIC_days_secs([86400 - J2000_TAI_SECONDS - 2e-4])
+    assert days.tolist() == [J2000_DAY + 1]
+    assert seconds.tolist() == [0.0]
+
+
+def test_round_trip():
+    epochs = np.arange(-5.0, 5.0) * 86400.123 + 7.5e8
+    for time_scale in ["TAI", "UTC"]:
+        days, seconds = epochs_to_CIC_days_secs(epochs, time_scale=time_scale)
+        round_trip = CIC_days_secs_to_epochs(days, seconds, time_scale=time_scale)
+        np.testing.assert_allclose(round_trip, epochs, rtol=0, atol=1e-6)
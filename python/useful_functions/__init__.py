@@ -1,4 +1,7 @@
 from .eclipses import *
+from .windows import *
+from .state_store import *
+from .results_store import *
 from .communication_windows import *
 from .frame_transformations import *
 from .get_input_data import *
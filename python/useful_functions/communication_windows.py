@@ -1,8 +1,11 @@
+from functools import lru_cache
+
 import numpy as np
 import pandas as pd
-from pyproj import Transformer
 from useful_functions.get_input_data import get_station
 from useful_functions.date_transformations import epoch_to_datetime
+from useful_functions.frame_transformations import compute_enu_rotation, lla2ecf
+from useful_functions.windows import NetworkWindowAccumulator
 
 
 def compute_visibility_vector(
@@ -23,24 +26,117 @@ def compute_visibility_vector(
     visibility_vector: np.ndarray
         Returns an array of boolean indicating whether the spacecraft is visible or not at each epoch.
     """
-    transformer = Transformer.from_crs(
-        {"proj": "latlong", "ellps": "WGS84", "datum": "WGS84"},
-        {"proj": "geocent", "ellps": "WGS84", "datum": "WGS84"},
-    )
+    station = get_ground_station(groundstation_name)
+    return station.compute_visibility(pos_ecf)
+
+
+class GroundStation:
+    """
+    Geodesy of a ground station computed once and reused by the visibility computations: position in ECF frame and
+    rotation to the local East, North, Up frame.
+    """
+
+    def __init__(self, longitude, latitude, altitude, minimum_elevation=0.0):
+        """
+        Parameters
+        ----------
+        longitude : float
+            Geodetic longitude in degrees
+        latitude : float
+            Geodetic latitude in degrees
+        altitude : float
+            Altitude above the WGS84 ellipsoid in meters
+        minimum_elevation : float, optional
+            Minimum elevation of the spacecraft for a communication in degrees, by default 0
+        """
+        self.longitude = longitude
+        self.latitude = latitude
+        self.altitude = altitude
+        self.minimum_elevation = minimum_elevation
+        self.ecf = lla2ecf(longitude, latitude, altitude)
+        self.enu_rotation = compute_enu_rotation(longitude, latitude)
+
+    def compute_enu_positions(self, pos_ecf):
+        """
+        Compute the positions of the spacecraft in the local East, North, Up frame of the station.
+
+        Parameters
+        ----------
+        pos_ecf : np.ndarray
+            Array of satellite positions in ECEF frame, of shape (t, 3)
+
+        Returns
+        -------
+        pos_enu : np.ndarray of shape (t, 3)
+            East, North and Up coordinates in meters
+        """
+        return (np.asarray(pos_ecf) - self.ecf) @ self.enu_rotation.T
+
+    def compute_azimuth_elevation(self, pos_ecf):
+        """
+        Compute the azimuth, elevation and distance of the spacecraft from the station.
+
+        Parameters
+        ----------
+        pos_ecf : np.ndarray
+            Array of satellite positions in ECEF frame, of shape (t, 3)
+
+        Returns
+        -------
+        azimuth : np.ndarray
+            Azimuth in degrees, clockwise from the North, between 0 and 360
+        elevation : np.ndarray
+            Elevation above the horizon in degrees
+        distance : np.ndarray
+            Distance in meters
+        """
+        pos_enu = self.compute_enu_positions(pos_ecf)
+        distance = np.sqrt(np.einsum("ij,ij->i", pos_enu, pos_enu))
+        azimuth = np.rad2deg(np.arctan2(pos_enu[:, 0], pos_enu[:, 1])) % 360
+        elevation = np.rad2deg(np.arcsin(np.clip(pos_enu[:, 2] / distance, -1, 1)))
+        return azimuth, elevation, distance
+
+    def compute_visibility(self, pos_ecf):
+        """
+        Compute the visibility vector of the spacecraft from the station.
+
+        Parameters
+        ----------
+        pos_ecf : np.ndarray
+            Array of satellite positions in ECEF frame, of shape (t, 3)
+
+        Returns
+        -------
+        visibility_vector: np.ndarray
+            Array of booleans, True where the elevation is above the minimum elevation of the station
+        """
+        pos_enu = self.compute_enu_positions(pos_ecf)
+        distance = np.sqrt(np.einsum("ij,ij->i", pos_enu, pos_enu))
+        return pos_enu[:, 2] >= np.sin(np.deg2rad(self.minimum_elevation)) * distance
+
+
+@lru_cache(maxsize=None)
+def get_ground_station(groundstation_name) -> GroundStation:
+    """
+    Get a ground station from input_data/groundstations. The CSV file is only read, and the geodesy of the station
+    only computed, on the first call for each name.
+
+    Parameters
+    ----------
+    groundstation_name : string
+        Name of a csv file containing the longitude, latitude, altitude, and minimum elevation of the groundstation.
+
+    Returns
+    -------
+    station : GroundStation
+    """
     station = get_station(groundstation_name)
-    station_ecf = transformer.transform(
-        station["longitude"], station["latitude"], station["altitude"], radians=False
-    )
-    station_sat_vector = pos_ecf - station_ecf
-    station_ecf_unit = station_ecf / np.linalg.norm(station_ecf)
-    station_sat_vector_unit = station_sat_vector.T / np.apply_along_axis(
-        np.linalg.norm, 1, station_sat_vector
+    return GroundStation(
+        station["longitude"],
+        station["latitude"],
+        station["altitude"],
+        station["minimum_elevation"],
     )
-    dot_product = np.dot(station_ecf_unit, station_sat_vector_unit)
-    elevation = 90 - np.arccos(dot_product) * 180 / np.pi
-
-    visibility_vector = elevation >= station["minimum_elevation"]
-    return visibility_vector
 
 
 def compute_communication_windows(
@@ -115,3 +211,210 @@ def compute_communication_windows(
     ]
 
     return visibility_df
+
+
+def compute_stations_ecef(stations: pd.DataFrame) -> np.ndarray:
+    """
+    Compute the ECEF positions of a network of ground stations.
+
+    Parameters
+    ----------
+    stations : pd.DataFrame
+        Ground stations, with the columns 'longitude', 'latitude' and 'altitude', as returned by get_station_network
+
+    Returns
+    -------
+    stations_ecf : np.ndarray of shape (n, 3)
+        Positions of the stations in ECEF frame in meters
+    """
+    return lla2ecf(
+        stations["longitude"].to_numpy(),
+        stations["latitude"].to_numpy(),
+        stations["altitude"].to_numpy(),
+    )
+
+
+class GroundStationNetwork:
+    """
+    Geodesy of a network of ground stations computed once and reused for every propagation chunk: positions in ECF
+    frame and rotations to the local East, North, Up frames.
+    """
+
+    def __init__(self, stations: pd.DataFrame):
+        """
+        Parameters
+        ----------
+        stations : pd.DataFrame
+            Ground stations, with the columns 'name', 'longitude', 'latitude', 'altitude' and 'minimum_elevation', as
+            returned by get_station_network
+        """
+        self.names = stations["name"].to_numpy()
+        self.minimum_elevations = stations["minimum_elevation"].to_numpy()
+        self.ecf = compute_stations_ecef(stations)
+        self.enu_rotations = np.array(
+            [
+                compute_enu_rotation(longitude, latitude)
+                for longitude, latitude in zip(
+                    stations["longitude"], stations["latitude"]
+                )
+            ]
+        ).reshape(-1, 3, 3)
+
+        # Up axes of the stations and their heights above the origin, for the elevations of compute_network_geometry
+        self.up = self.enu_rotations[:, 2]
+        self.up_offsets = np.sum(self.up * self.ecf, axis=1)
+        self.squared_norms = np.sum(self.ecf**2, axis=1)
+
+
+def compute_network_geometry(pos_ecf: np.ndarray, network: GroundStationNetwork):
+    """
+    Compute the distance and the sine of the elevation of the spacecraft from each ground station of a network, at
+    each epoch.
+
+    The elevation is measured from the plane tangent to the WGS84 ellipsoid. The dot products and distances are
+    obtained from (t, 3) x (3, n) matrix products, without (t, n, 3) intermediate arrays.
+
+    Parameters
+    ----------
+    pos_ecf : np.ndarray
+        Array of satellite positions in ECEF frame, of shape (t, 3)
+    network : GroundStationNetwork
+        Ground stations, e.g. GroundStationNetwork(get_station_network())
+
+    Returns
+    -------
+    distances : np.ndarray of shape (t, n)
+        Distances between the spacecraft and the stations in meters
+    sin_elevations : np.ndarray of shape (t, n)
+        Sines of the elevations of the spacecraft
+    """
+    pos_ecf = np.asarray(pos_ecf, dtype=np.float64)
+
+    # up . (r - s) and |r - s|^2 = |r|^2 - 2 r . s + |s|^2
+    heights = pos_ecf @ network.up.T - network.up_offsets
+    distances = np.sqrt(
+        np.sum(pos_ecf**2, axis=1)[:, None]
+        - 2 * pos_ecf @ network.ecf.T
+        + network.squared_norms
+    )
+    return distances, heights / distances
+
+
+def compute_network_elevations(
+    pos_ecf: np.ndarray, network: GroundStationNetwork
+) -> np.ndarray:
+    """
+    Compute the elevation of the spacecraft above the horizon of each ground station of a network, at each epoch.
+
+    Parameters
+    ----------
+    pos_ecf : np.ndarray
+        Array of satellite positions in ECEF frame, of shape (t, 3)
+    network : GroundStationNetwork
+        Ground stations, e.g. GroundStationNetwork(get_station_network())
+
+    Returns
+    -------
+    elevations : np.ndarray of shape (t, n)
+        Elevations of the spacecraft in degrees
+    """
+    sin_elevations = compute_network_geometry(pos_ecf, network)[1]
+    return np.rad2deg(np.arcsin(np.clip(sin_elevations, -1, 1)))
+
+
+def compute_network_visibility(
+    pos_ecf: np.ndarray, network: GroundStationNetwork
+) -> np.ndarray:
+    """
+    Compute the visibility of the spacecraft from each ground station of a network, at each epoch.
+
+    Parameters
+    ----------
+    pos_ecf : np.ndarray
+        Array of satellite positions in ECEF frame, of shape (t, 3)
+    network : GroundStationNetwork
+        Ground stations, e.g. GroundStationNetwork(get_station_network())
+
+    Returns
+    -------
+    visibility_matrix : np.ndarray of shape (t, n)
+        Array of booleans, True where the elevation is above the minimum elevation of the station
+    """
+    sin_elevations = compute_network_geometry(pos_ecf, network)[1]
+    return sin_elevations >= np.sin(np.deg2rad(network.minimum_elevations))
+
+
+def compute_network_windows(
+    pos_ecf: np.ndarray, network: GroundStationNetwork, epochs: np.ndarray
+) -> pd.DataFrame:
+    """
+    Compute the communication windows of the spacecraft with each ground station of a network.
+
+    For several propagation chunks, use compute_network_visibility and a NetworkWindowAccumulator to stitch the
+    windows crossing the end of a chunk.
+
+    Parameters
+    ----------
+    pos_ecf : np.ndarray
+        Array of satellite positions in ECEF frame, of shape (t, 3)
+    network : GroundStationNetwork
+        Ground stations, e.g. GroundStationNetwork(get_station_network())
+    epochs : np.ndarray
+        Array of epochs in seconds since J2000
+
+    Returns
+    -------
+    windows_df: pd.DataFrame
+        Windows of each station, with a 'station' column and the columns of compute_communication_windows
+    """
+    window_accumulator = NetworkWindowAccumulator(network.names)
+    windows_df = window_accumulator.add_chunk(
+        compute_network_visibility(pos_ecf, network), epochs
+    )
+    return pd.concat([windows_df, window_accumulator.finish()], ignore_index=True)
+
+
+def compute_network_statistics(
+    windows_df: pd.DataFrame, network: GroundStationNetwork, days: float
+) -> pd.DataFrame:
+    """
+    Compute the contact statistics of each ground station of a network.
+
+    Parameters
+    ----------
+    windows_df : pd.DataFrame
+        Windows of the network, as returned by compute_network_windows or a NetworkWindowAccumulator
+    network : GroundStationNetwork
+        Ground stations, e.g. GroundStationNetwork(get_station_network())
+    days : float
+        Duration of the analysis in days
+
+    Returns
+    -------
+    statistics_df: pd.DataFrame
+        Data frame indexed by station name, with the columns
+         - 'passes' : number of windows
+         - 'total_duration' : total duration of the windows in seconds
+         - 'mean_duration' : mean duration of the windows in seconds
+         - 'max_duration' : maximum duration of the windows in seconds
+         - 'passes_per_day' : average number of windows per day
+         - 'visibility_per_day' : average duration of the windows per day in seconds
+    """
+    windows_df = windows_df[windows_df["duration"] > 0]
+    statistics_df = (
+        windows_df.groupby("station")["duration"]
+        .agg(
+            passes="count",
+            total_duration="sum",
+            mean_duration="mean",
+            max_duration="max",
+        )
+        .reindex(network.names)
+        .rename_axis("station")
+    )
+    statistics_df[["passes", "total_duration"]] = statistics_df[
+        ["passes", "total_duration"]
+    ].fillna(0)
+    statistics_df["passes_per_day"] = statistics_df["passes"] / days
+    statistics_df["visibility_per_day"] = statistics_df["total_duration"] / days
+    return statistics_df
@@ -1 +1,5 @@
 SPEED_OF_LIGHT = 299792458.0  # m/s
+ASTRONOMICAL_UNIT = 149597870700.0  # m
+EARTH_GRAVITATIONAL_PARAMETER = 3.986004418e14  # m^3/s^2
+EARTH_EQUATORIAL_RADIUS = 6378137.0  # m
+EARTH_J2 = 1.08262668e-3
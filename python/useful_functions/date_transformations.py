@@ -1,9 +1,42 @@
 import pandas
 import datetime
+import erfa
 import numpy as np
 from astropy.time import Time, TimeDelta
 
 J2000 = Time("J2000.0", format="jyear_str", scale="utc")
+J2000_CJD = 18262.5  # CNES julian day (days since 1950-01-01 00:00:00) of J2000
+J2000_DATETIME64 = np.datetime64("2000-01-01T12:00:00", "ns")
+
+
+def get_leap_second_table():
+    """
+    Get the epochs (in seconds since J2000) from which each value of TAI-UTC applies, using the leap second table of
+    ERFA (the one used by astropy). Only the integer leap seconds introduced since 1972 are kept.
+
+    Returns
+    -------
+    leap_second_epochs : np.ndarray
+        Epochs in seconds since J2000 of each change of TAI-UTC
+    leap_second_offsets : np.ndarray
+        Offset in seconds between UTC and the epochs, i.e. TAI-UTC minus its value at J2000, from each epoch
+    """
+    leap_seconds = erfa.leap_seconds.get()
+    leap_seconds = leap_seconds[leap_seconds["year"] >= 1972]
+    change_dates = np.array(
+        [f"{year:04d}-{month:02d}-01" for year, month in leap_seconds[["year", "month"]]],
+        dtype="datetime64[ns]",
+    )
+    tai_utc = leap_seconds["tai_utc"]
+    tai_utc_j2000 = tai_utc[np.searchsorted(change_dates, J2000_DATETIME64) - 1]
+    leap_second_offsets = tai_utc - tai_utc_j2000
+    leap_second_epochs = (change_dates - J2000_DATETIME64) / np.timedelta64(
+        1, "s"
+    ) + leap_second_offsets
+    return leap_second_epochs, leap_second_offsets
+
+
+LEAP_SECOND_EPOCHS, LEAP_SECOND_OFFSETS = get_leap_second_table()
 
 
 def datetime_to_epoch_raw(datetime_object):
@@ -12,21 +45,50 @@ def datetime_to_epoch_raw(datetime_object):
 
 
 def datetime_to_epoch(datetime_object):
-    astrotime = Time(datetime_object, scale="utc")
-    if isinstance(datetime_object, datetime.datetime):
-        return astrotime_to_epoch_raw(astrotime)
-    elif isinstance(datetime_object, list):
-        return astrotime_to_epoch_raw(astrotime)
-    elif isinstance(datetime_object, np.ndarray):
-        return astrotime_to_epoch_raw(astrotime)
+    if isinstance(datetime_object, (datetime.datetime, list, np.ndarray)):
+        return astrotime_to_epoch_raw(Time(datetime_object, scale="utc"))
     elif isinstance(datetime_object, dict):
         return {key: datetime_to_epoch_raw(dt) for key, dt in datetime_object.items()}
-    elif isinstance(datetime_object, pandas.Series) or isinstance(
-        datetime_object, pandas.DataFrame
-    ):
+    elif isinstance(datetime_object, pandas.Series):
+        utc_datetimes = pandas.to_datetime(datetime_object, utc=True).dt.tz_localize(None)
+        return pandas.Series(
+            datetime64_to_epoch(utc_datetimes.to_numpy()),
+            index=datetime_object.index,
+            name=datetime_object.name,
+        )
+    elif isinstance(datetime_object, pandas.DataFrame):
         return datetime_object.apply(datetime_to_epoch_raw)
 
 
+def datetime64_to_epoch(datetimes):
+    """
+    Convert UTC dates to epochs in seconds since J2000, with numpy datetime64 arithmetic and the leap second table
+    instead of one astropy Time per element.
+
+    Parameters
+    ----------
+    datetimes : np.datetime64 or np.ndarray
+        UTC dates as datetime64 (without time zone)
+
+    Returns
+    -------
+    epoch : np.ndarray
+        Epochs in seconds since J2000
+    """
+    elapsed = np.asarray(datetimes, dtype="datetime64[ns]") - J2000_DATETIME64
+    whole_seconds = elapsed // np.timedelta64(1, "s")
+    utc_seconds = whole_seconds + (
+        elapsed - whole_seconds * np.timedelta64(1, "s")
+    ) / np.timedelta64(1, "s")
+    leap_second_index = (
+        np.searchsorted(
+            LEAP_SECOND_EPOCHS - LEAP_SECOND_OFFSETS, utc_seconds, side="right"
+        )
+        - 1
+    )
+    return utc_seconds + LEAP_SECOND_OFFSETS[np.maximum(leap_second_index, 0)]
+
+
 def epoch_to_datetime_raw(epoch):
     astrotime = epoch_to_astrotime_raw(epoch)
     dt = astrotime.datetime.replace(tzinfo=datetime.timezone.utc)
@@ -39,13 +101,60 @@ def epoch_to_datetime(epoch):
     elif isinstance(epoch, list):
         return [epoch_to_datetime_raw(ep) for ep in epoch]
     elif isinstance(epoch, np.ndarray):
-        return np.array(epoch_to_datetime(epoch.tolist()))
+        return epoch_to_datetime_index(epoch, unit="us").to_pydatetime()
     elif isinstance(epoch, dict):
         return {key: epoch_to_datetime_raw(ep) for key, ep in epoch.items()}
+    elif isinstance(epoch, pandas.Series) and pandas.api.types.is_numeric_dtype(epoch):
+        return pandas.Series(
+            epoch_to_datetime_index(epoch.to_numpy(), unit="us"),
+            index=epoch.index,
+            name=epoch.name,
+        )
     elif isinstance(epoch, pandas.Series) or isinstance(epoch, pandas.DataFrame):
         return epoch.apply(epoch_to_datetime_raw)
 
 
+def epoch_to_datetime64(epoch, unit="ns"):
+    """
+    Convert epochs in seconds since J2000 to UTC dates, with numpy datetime64 arithmetic and the leap second table
+    instead of one astropy Time per element.
+
+    Parameters
+    ----------
+    epoch : float or np.ndarray
+        Epochs in seconds since J2000
+    unit : str
+        Resolution of the dates, "ns" or "us" for instance. Optional, default is "ns".
+
+    Returns
+    -------
+    datetimes : np.ndarray
+        UTC dates as datetime64 (without time zone). An epoch during a leap second is given as the first instant
+        of the next day.
+    """
+    epoch = np.asarray(epoch, dtype=np.float64)
+    leap_second_index = np.searchsorted(LEAP_SECOND_EPOCHS, epoch, side="right") - 1
+    utc_seconds = epoch - LEAP_SECOND_OFFSETS[np.maximum(leap_second_index, 0)]
+    # Split the integer seconds to keep the sub-microsecond precision in int64 ticks
+    ticks_per_second = np.timedelta64(1, "s") // np.timedelta64(1, unit)
+    whole_seconds = np.floor(utc_seconds)
+    ticks = whole_seconds.astype(np.int64) * ticks_per_second + np.round(
+        (utc_seconds - whole_seconds) * ticks_per_second
+    ).astype(np.int64)
+    return J2000_DATETIME64.astype(f"datetime64[{unit}]") + ticks.astype(
+        f"timedelta64[{unit}]"
+    )
+
+
+def epoch_to_datetime_index(epoch, unit="ns"):
+    """
+    Convert epochs in seconds since J2000 to a UTC pandas DatetimeIndex, see epoch_to_datetime64. The dates are
+    rounded to the given unit and stored in nanoseconds.
+    """
+    datetimes = epoch_to_datetime64(epoch, unit=unit).astype("datetime64[ns]")
+    return pandas.DatetimeIndex(np.atleast_1d(datetimes)).tz_localize("UTC")
+
+
 def epoch_to_astrotime_raw(epoch):
     # Handle pandas.Timestamp
     if isinstance(epoch, pandas.Timestamp):
@@ -68,11 +177,12 @@ def epoch_to_astrotime(epoch):
         return epoch_to_astrotime_raw(epoch)
     elif isinstance(epoch, list):
         return [epoch_to_astrotime_raw(ep) for ep in epoch]
-    elif isinstance(epoch, np.ndarray):
-        return np.array(epoch_to_astrotime(epoch.tolist()))
+    elif isinstance(epoch, np.ndarray) or isinstance(epoch, pandas.Series):
+        # One array-valued Time instead of one Time per element
+        return epoch_to_astrotime_raw(epoch)
     elif isinstance(epoch, dict):
         return {key: epoch_to_astrotime_raw(ep) for key, ep in epoch.items()}
-    elif isinstance(epoch, pandas.Series) or isinstance(epoch, pandas.DataFrame):
+    elif isinstance(epoch, pandas.DataFrame):
         return epoch.apply(epoch_to_astrotime_raw)
 
 
@@ -93,3 +203,11 @@ def astrotime_to_epoch(astrotime):
         astrotime, pandas.DataFrame
     ):
         return astrotime.apply(astrotime_to_epoch_raw)
+
+
+def cjd_to_epoch(cjd):
+    """
+    Convert CNES julian days (days since 1950-01-01 00:00:00, used by CelestLab and STELA) to epochs in seconds since
+    J2000, in the same time scale.
+    """
+    return (np.asarray(cjd, dtype=np.float64) - J2000_CJD) * 86400
@@ -0,0 +1,358 @@
+import numpy as np
+
+from useful_functions.constants import (
+    EARTH_EQUATORIAL_RADIUS,
+    EARTH_GRAVITATIONAL_PARAMETER,
+    EARTH_J2,
+    SPEED_OF_LIGHT,
+)
+
+# Widening of the antenna cones in degrees in compute_link_candidates
+CULLING_MARGIN = 1e-6
+
+
+def compute_angles(vectors, directions):
+    """
+    Compute the angles between vectors of several satellites and one direction per epoch.
+
+    Parameters
+    ----------
+    vectors : np.ndarray of shape (t, s, 3)
+        Unit vectors at each epoch for each satellite
+    directions : np.ndarray of shape (t, 3) or (t, s, 3)
+        Directions at each epoch, shared by all satellites or not, not necessarily normalized
+
+    Returns
+    -------
+    angles : np.ndarray of shape (t, s)
+        Angles in degrees
+    """
+    directions = directions / np.linalg.norm(directions, axis=-1, keepdims=True)
+    if directions.ndim == 2:
+        cosines = np.einsum("tsi,ti->ts", vectors, directions)
+    else:
+        cosines = np.einsum("tsi,tsi->ts", vectors, directions)
+    return np.rad2deg(np.arccos(np.clip(cosines, -1, 1)))
+
+
+def compute_gravity_acceleration(
+    positions,
+    gravitational_parameter=EARTH_GRAVITATIONAL_PARAMETER,
+    j2=EARTH_J2,
+    equatorial_radius=EARTH_EQUATORIAL_RADIUS,
+):
+    """
+    Compute the point mass and J2 gravity acceleration of the Earth, with the pole along the z axis of the frame.
+
+    Parameters
+    ----------
+    positions : np.ndarray of shape (..., 3)
+        Positions in meters
+    gravitational_parameter : float, optional
+        Gravitational parameter of the Earth in m^3/s^2, by default EARTH_GRAVITATIONAL_PARAMETER
+    j2 : float, optional
+        Second zonal harmonic of the Earth, by default EARTH_J2 (0 for a point mass)
+    equatorial_radius : float, optional
+        Equatorial radius of the Earth in meters, by default EARTH_EQUATORIAL_RADIUS
+
+    Returns
+    -------
+    accelerations : np.ndarray of shape (..., 3)
+        Accelerations in meters per second squared
+    """
+    positions = np.asarray(positions, dtype=np.float64)
+    radius_squared = np.einsum("...i,...i->...", positions, positions)
+    radius = np.sqrt(radius_squared)
+    z_squared_ratio = positions[..., 2] ** 2 / radius_squared
+    j2_factor = 1.5 * j2 * equatorial_radius**2 / radius_squared
+    point_mass_factor = -gravitational_parameter / radius**3
+    accelerations = positions * (
+        point_mass_factor * (1 + j2_factor * (1 - 5 * z_squared_ratio))
+    )[..., None]
+    accelerations[..., 2] += point_mass_factor * 2 * j2_factor * positions[..., 2]
+    return accelerations
+
+
+def compute_doppler_shift_rate(
+    relative_position, relative_velocity, relative_acceleration, frequency
+):
+    """
+    Compute the relativistic Doppler shift and its time derivative from the relative state and acceleration of an
+    emitter, epoch by epoch, so that any set of samples can be processed independently.
+
+    Parameters
+    ----------
+    relative_position : np.ndarray of shape (..., 3)
+        Position of the emitter relative to the receiver in meters
+    relative_velocity : np.ndarray of shape (..., 3)
+        Velocity of the emitter relative to the receiver in meters per second
+    relative_acceleration : np.ndarray of shape (..., 3)
+        Acceleration of the emitter relative to the receiver in meters per second squared
+    frequency : float
+        Emitted frequency in Hz
+
+    Returns
+    -------
+    doppler_shift : np.ndarray of shape (...)
+        Doppler shift in Hz
+    doppler_rate : np.ndarray of shape (...)
+        Doppler rate in Hz/s
+    """
+    distance = np.sqrt(
+        np.einsum("...i,...i->...", relative_position, relative_position)
+    )
+    speed_squared = np.einsum("...i,...i->...", relative_velocity, relative_velocity)
+    range_rate = (
+        np.einsum("...i,...i->...", relative_position, relative_velocity) / distance
+    )
+    range_acceleration = (
+        speed_squared
+        + np.einsum("...i,...i->...", relative_position, relative_acceleration)
+        - range_rate**2
+    ) / distance
+
+    # f_d = f * (1 / (gamma * (1 + range_rate / c)) - 1), derived with respect to time
+    gamma = 1 / np.sqrt(1 - speed_squared / SPEED_OF_LIGHT**2)
+    gamma_rate = (
+        gamma**3
+        * np.einsum("...i,...i->...", relative_velocity, relative_acceleration)
+        / SPEED_OF_LIGHT**2
+    )
+    denominator = gamma * (1 + range_rate / SPEED_OF_LIGHT)
+    denominator_rate = (
+        gamma_rate * (1 + range_rate / SPEED_OF_LIGHT)
+        + gamma * range_acceleration / SPEED_OF_LIGHT
+    )
+    doppler_shift = frequency * (1 / denominator - 1)
+    doppler_rate = -frequency * denominator_rate / denominator**2
+    return doppler_shift, doppler_rate
+
+
+def compute_earth_occultation(
+    receiver_positions, emitter_positions, earth_radius=EARTH_EQUATORIAL_RADIUS
+):
+    """
+    Check whether the Earth, as a sphere, blocks the line of sight between a receiver and emitters.
+
+    Parameters
+    ----------
+    receiver_positions : np.ndarray of shape (..., 3)
+        Positions of the receiver in meters, e.g. of shape (t, 1, 3)
+    emitter_positions : np.ndarray of shape (..., 3)
+        Positions of the emitters in meters, broadcastable with the receiver positions, e.g. of shape (t, s, 3)
+    earth_radius : float, optional
+        Radius of the Earth in meters, by default EARTH_EQUATORIAL_RADIUS
+
+    Returns
+    -------
+    occulted : np.ndarray of shape (...)
+        True where the segment between the receiver and an emitter crosses the Earth
+    """
+    line_of_sight = emitter_positions - receiver_positions
+    receiver_dot_line = np.einsum("...i,...i->...", receiver_positions, line_of_sight)
+    line_squared = np.einsum("...i,...i->...", line_of_sight, line_of_sight)
+    # Squared distance to the center of the Earth of the point of the segment closest to it
+    closest_fraction = np.clip(-receiver_dot_line / line_squared, 0, 1)
+    closest_distance_squared = (
+        np.einsum("...i,...i->...", receiver_positions, receiver_positions)
+        + closest_fraction * (2 * receiver_dot_line + closest_fraction * line_squared)
+    )
+    return closest_distance_squared < earth_radius**2
+
+
+def compute_link_candidates(
+    receiver_positions,
+    emitter_positions,
+    max_distance=None,
+    receiver_antenna_vectors=None,
+    receiver_half_angle=None,
+    emitter_half_angle=None,
+):
+    """
+    Cheap geometric test, with dot products only, selecting the links that can be visible before the computation of
+    the angles and the Doppler: the emitter is not occulted by the Earth, is within max_distance of the receiver and,
+    if given, within the cones of the antennas of the receiver and of the (nadir pointing) emitter. The cones are
+    slightly widened so that no visible link is dropped because of rounding errors.
+
+    Parameters
+    ----------
+    receiver_positions : np.ndarray of shape (..., 3)
+        Positions of the receiver in meters
+    emitter_positions : np.ndarray of shape (..., 3)
+        Positions of the emitters in meters, broadcastable with the receiver positions
+    max_distance : float, optional
+        Maximum distance between the receiver and an emitter in meters, by default None (no distance condition)
+    receiver_antenna_vectors : list of np.ndarray of shape (..., 3), optional
+        Pointing directions of the antennas of the receiver, broadcastable with the receiver positions, by default
+        None (no receiver antenna condition)
+    receiver_half_angle : float, optional
+        Half-angle of the receiver antennas in degrees, required with receiver_antenna_vectors
+    emitter_half_angle : float, optional
+        Half-angle of the emitter antennas in degrees, by default None (no emitter antenna condition)
+
+    Returns
+    -------
+    candidates : np.ndarray of shape (...)
+        False where the link is certainly not visible
+    """
+    candidates = ~compute_earth_occultation(receiver_positions, emitter_positions)
+    relative_position = emitter_positions - receiver_positions
+    distance = np.sqrt(
+        np.einsum("...i,...i->...", relative_position, relative_position)
+    )
+    if max_distance is not None:
+        candidates &= distance <= max_distance
+    if receiver_antenna_vectors is not None:
+        minimum_cosine = np.cos(np.deg2rad(receiver_half_angle + CULLING_MARGIN))
+        in_receiver_cone = np.zeros_like(candidates)
+        for antenna_vector in receiver_antenna_vectors:
+            in_receiver_cone |= np.einsum(
+                "...i,...i->...", relative_position, antenna_vector
+            ) >= minimum_cosine * distance * np.linalg.norm(
+                antenna_vector, axis=-1
+            )
+        candidates &= in_receiver_cone
+    if emitter_half_angle is not None:
+        minimum_cosine = np.cos(np.deg2rad(emitter_half_angle + CULLING_MARGIN))
+        candidates &= np.einsum(
+            "...i,...i->...", relative_position, emitter_positions
+        ) >= minimum_cosine * distance * np.linalg.norm(emitter_positions, axis=-1)
+    return candidates
+
+
+def compute_doppler_visibility_arrays(
+    epochs,
+    receiver_states,
+    emitter_states,
+    receiver_antenna_vectors,
+    frequency,
+    doppler_shift_limit,
+    doppler_rate_limit,
+    receiver_half_angle,
+    emitter_half_angle,
+    max_distance=None,
+    receiver_accelerations=None,
+    emitter_accelerations=None,
+    doppler_rate_method="analytic",
+):
+    """
+    Compute the Doppler shift and rate and the visibility conditions between one receiver (TOLOSAT) and several
+    emitters (for instance the satellites of a GNSS constellation) at once.
+
+    Parameters
+    ----------
+    epochs : np.ndarray of shape (t,)
+        Epochs in seconds since J2000, only used by the "gradient" Doppler rate
+    receiver_states : np.ndarray of shape (t, 6)
+        States of the receiver in meters and meters per second
+    emitter_states : np.ndarray of shape (t, s, 6)
+        States of the s emitters in meters and meters per second, in the same frame
+    receiver_antenna_vectors : list of np.ndarray of shape (t, 3)
+        Pointing directions of the antennas of the receiver, the receiver sees an emitter through any of them
+    frequency : float
+        Emitted frequency in Hz
+    doppler_shift_limit : float
+        Maximum absolute Doppler shift in Hz
+    doppler_rate_limit : float
+        Maximum absolute Doppler rate in Hz/s
+    receiver_half_angle : float
+        Half-angle of the receiver antennas in degrees
+    emitter_half_angle : float
+        Half-angle of the emitter antennas, pointing towards the Earth center, in degrees
+    max_distance : float, optional
+        Maximum distance between the receiver and an emitter in meters, by default None (no distance condition)
+    receiver_accelerations : np.ndarray of shape (t, 3), optional
+        Accelerations of the receiver in meters per second squared, by default the point mass and J2 gravity of the
+        Earth from compute_gravity_acceleration
+    emitter_accelerations : np.ndarray of shape (t, s, 3), optional
+        Accelerations of the emitters, by default the point mass and J2 gravity of the Earth
+    doppler_rate_method : str, optional
+        "analytic" to derive the Doppler rate from the relative accelerations at each epoch, or "gradient" to
+        differentiate the Doppler shift numerically between the epochs, by default "analytic"
+
+    Returns
+    -------
+    results : dict of np.ndarray
+        Arrays of shape (t, s):
+         - 'distance' : distance between the receiver and each emitter in meters
+         - 'doppler_shift' : Doppler shift in Hz
+         - 'doppler_rate' : Doppler rate in Hz/s
+         - 'emitter_angle' : angle between the line of sight and the emitter nadir direction in degrees
+         - 'doppler_shift_OK', 'doppler_rate_OK', 'receiver_visibility_OK', 'emitter_visibility_OK', 'distance_OK',
+           'earth_visibility_OK' : masks of each condition, the last one being False when the Earth blocks the line of
+           sight
+         - 'all_OK' : mask of the epochs where all conditions are satisfied
+        and 'receiver_angles', the list of the angles between the line of sight and each receiver antenna in degrees.
+    """
+    receiver_states = np.asarray(receiver_states)
+    emitter_states = np.asarray(emitter_states)
+    relative_position = emitter_states[:, :, :3] - receiver_states[:, None, :3]
+    relative_velocity = emitter_states[:, :, 3:] - receiver_states[:, None, 3:]
+    distance = np.linalg.norm(relative_position, axis=2)
+    line_of_sight = relative_position / distance[:, :, None]
+
+    if doppler_rate_method == "analytic":
+        if receiver_accelerations is None:
+            receiver_accelerations = compute_gravity_acceleration(
+                receiver_states[:, :3]
+            )
+        if emitter_accelerations is None:
+            emitter_accelerations = compute_gravity_acceleration(
+                emitter_states[:, :, :3]
+            )
+        relative_acceleration = emitter_accelerations - np.asarray(
+            receiver_accelerations
+        )[:, None, :]
+        doppler_shift, doppler_rate = compute_doppler_shift_rate(
+            relative_position, relative_velocity, relative_acceleration, frequency
+        )
+    elif doppler_rate_method == "gradient":
+        doppler_shift = compute_doppler_shift_rate(
+            relative_position,
+            relative_velocity,
+            np.zeros_like(relative_velocity),
+            frequency,
+        )[0]
+        doppler_rate = np.gradient(doppler_shift, epochs, axis=0)
+    else:
+        raise ValueError("doppler_rate_method must be 'analytic' or 'gradient'")
+
+    receiver_angles = [
+        compute_angles(line_of_sight, antenna_vector)
+        for antenna_vector in receiver_antenna_vectors
+    ]
+    emitter_angle = compute_angles(line_of_sight, emitter_states[:, :, :3])
+
+    doppler_shift_ok = np.abs(doppler_shift) <= doppler_shift_limit
+    doppler_rate_ok = np.abs(doppler_rate) <= doppler_rate_limit
+    receiver_visibility_ok = np.logical_or.reduce(
+        [angles <= receiver_half_angle for angles in receiver_angles]
+    )
+    emitter_visibility_ok = emitter_angle <= emitter_half_angle
+    if max_distance is None:
+        distance_ok = np.ones_like(distance, dtype=bool)
+    else:
+        distance_ok = distance <= max_distance
+    earth_visibility_ok = ~compute_earth_occultation(
+        receiver_states[:, None, :3], emitter_states[:, :, :3]
+    )
+
+    return {
+        "distance": distance,
+        "doppler_shift": doppler_shift,
+        "doppler_rate": doppler_rate,
+        "receiver_angles": receiver_angles,
+        "emitter_angle": emitter_angle,
+        "doppler_shift_OK": doppler_shift_ok,
+        "doppler_rate_OK": doppler_rate_ok,
+        "receiver_visibility_OK": receiver_visibility_ok,
+        "emitter_visibility_OK": emitter_visibility_ok,
+        "distance_OK": distance_ok,
+        "earth_visibility_OK": earth_visibility_ok,
+        "all_OK": doppler_shift_ok
+        & doppler_rate_ok
+        & receiver_visibility_ok
+        & emitter_visibility_ok
+        & distance_ok
+        & earth_visibility_ok,
+    }
@@ -1,13 +1,21 @@
 from tudatpy.kernel.astro.fundamentals import compute_shadow_function
 import numpy as np
 import pandas as pd
+from scipy.interpolate import CubicHermiteSpline, CubicSpline
+from scipy.optimize import brentq
 
+from useful_functions.constants import ASTRONOMICAL_UNIT
 from useful_functions.date_transformations import epoch_to_datetime
+from useful_functions.windows import get_window_indices, get_windows_dataframe
 
 
-def compute_shadow_vector(satellite_position, sun_position, sun_radius, earth_radius):
+def compute_shadow_vector_tudat(
+    satellite_position, sun_position, sun_radius, earth_radius
+):
     """
-    Compute the shadow vector of the spacecraft at each epoch.
+    Compute the shadow vector of the spacecraft at each epoch by calling the tudat shadow function once per epoch.
+    This is the reference implementation, used to validate compute_shadow_vector.
+
     Parameters
     ----------
     satellite_position : ndarray
@@ -22,13 +30,10 @@ def compute_shadow_vector(satellite_position, sun_position, sun_radius, earth_ra
     Returns
     -------
     shadow_vector : ndarray
-         Returns a vector with the value of the shadow function at each epoch :
-         - 0 if the satellite is in umbra
-         - 1 if the satellite is fully sunlit
-         - a value between 0 and 1 if the satellite is in penumbra
+         Returns a vector with the value of the shadow function at each epoch
     """
     shadow_vector = np.empty(len(satellite_position))
-    shadow_vector[:] = np.NaN
+    shadow_vector[:] = np.nan
     for ii in range(len(satellite_position)):
         shadow_vector[ii] = compute_shadow_function(
             sun_position[ii],
@@ -40,6 +45,130 @@ def compute_shadow_vector(satellite_position, sun_position, sun_radius, earth_ra
     return shadow_vector
 
 
+def compute_shadow_geometry(satellite_position, sun_position, sun_radius, earth_radius):
+    """
+    Compute the apparent radii of the Sun and the Earth and the apparent separation of their centers, as seen from
+    the spacecraft at each epoch.
+
+    Parameters
+    ----------
+    satellite_position : ndarray
+        Array of satellite positions in ECI frame
+    sun_position : ndarray
+        Array of sun positions in ECI frame
+    sun_radius : float
+        Sun radius in meters
+    earth_radius : float
+        Earth radius in meters
+
+    Returns
+    -------
+    sun_apparent_radius : ndarray
+        Apparent radius of the Sun in radians
+    earth_apparent_radius : ndarray
+        Apparent radius of the Earth in radians
+    separation : ndarray
+        Apparent separation of the centers of the Sun and the Earth in radians
+    """
+    # Directions from the satellite to the Sun and to the Earth (at the origin)
+    satellite_to_sun = sun_position - satellite_position
+    satellite_to_earth = -satellite_position
+    sun_distance = np.linalg.norm(satellite_to_sun, axis=1)
+    earth_distance = np.linalg.norm(satellite_to_earth, axis=1)
+
+    sun_apparent_radius = np.arcsin(sun_radius / sun_distance)
+    earth_apparent_radius = np.arcsin(earth_radius / earth_distance)
+    cos_separation = np.einsum("ij,ij->i", satellite_to_sun, satellite_to_earth) / (
+        sun_distance * earth_distance
+    )
+    separation = np.arccos(np.clip(cos_separation, -1.0, 1.0))
+    return sun_apparent_radius, earth_apparent_radius, separation
+
+
+def compute_shadow_vector(
+    satellite_position,
+    sun_position,
+    sun_radius,
+    earth_radius,
+    validate=False,
+    validation_samples=1000,
+    validation_tolerance=1e-6,
+):
+    """
+    Compute the shadow vector of the spacecraft at each epoch.
+    Uses the same conical umbra/penumbra model as the tudat shadow function (Montenbruck & Gill, section 3.4.2),
+    evaluated on the full arrays at once.
+
+    Parameters
+    ----------
+    satellite_position : ndarray
+        Array of satellite positions in ECI frame
+    sun_position : ndarray
+        Array of sun positions in ECI frame
+    sun_radius : float
+        Sun radius in meters
+    earth_radius : float
+        Earth radius in meters
+    validate : bool
+        If True, compare the result with the tudat shadow function on a subset of the epochs. Optional, default is
+        False.
+    validation_samples : int
+        Number of evenly spaced epochs used for the validation. Optional, default is 1000.
+    validation_tolerance : float
+        Maximum absolute difference allowed with the tudat shadow function. Optional, default is 1e-6.
+
+    Returns
+    -------
+    shadow_vector : ndarray
+         Returns a vector with the value of the shadow function at each epoch :
+         - 0 if the satellite is in umbra
+         - 1 if the satellite is fully sunlit
+         - a value between 0 and 1 if the satellite is in penumbra
+    """
+    satellite_position = np.asarray(satellite_position, dtype=np.float64)
+    sun_position = np.asarray(sun_position, dtype=np.float64)
+    sun_apparent_radius, earth_apparent_radius, separation = compute_shadow_geometry(
+        satellite_position, sun_position, sun_radius, earth_radius
+    )
+
+    shadow_vector = np.ones(len(satellite_position))
+
+    penumbra = (np.abs(sun_apparent_radius - earth_apparent_radius) < separation) & (
+        separation < sun_apparent_radius + earth_apparent_radius
+    )
+    umbra = separation < earth_apparent_radius - sun_apparent_radius
+    antumbra = separation < sun_apparent_radius - earth_apparent_radius
+
+    # Area of the occulted part of the solar disk
+    a = sun_apparent_radius[penumbra]
+    b = earth_apparent_radius[penumbra]
+    c = separation[penumbra]
+    x = (c**2 + a**2 - b**2) / (2 * c)
+    y = np.sqrt(a**2 - x**2)
+    occulted_area = a**2 * np.arccos(x / a) + b**2 * np.arccos((c - x) / b) - c * y
+    shadow_vector[penumbra] = 1 - occulted_area / (np.pi * a**2)
+
+    shadow_vector[umbra & ~penumbra] = 0
+    shadow_vector[antumbra & ~penumbra] = 1 - (
+        earth_apparent_radius[antumbra & ~penumbra] ** 2
+        / sun_apparent_radius[antumbra & ~penumbra] ** 2
+    )
+
+    if validate and len(satellite_position) > 0:
+        samples = np.unique(
+            np.linspace(0, len(satellite_position) - 1, validation_samples).astype(int)
+        )
+        tudat_shadow_vector = compute_shadow_vector_tudat(
+            satellite_position[samples], sun_position[samples], sun_radius, earth_radius
+        )
+        max_difference = np.max(np.abs(shadow_vector[samples] - tudat_shadow_vector))
+        if max_difference > validation_tolerance:
+            raise ValueError(
+                f"Shadow vector differs from the tudat shadow function by {max_difference:.3e}"
+            )
+    return shadow_vector
+
+
 def compute_eclipses(
     satellite_position: np.ndarray,
     sun_position: np.ndarray,
@@ -47,6 +176,7 @@ def compute_eclipses(
     earth_radius: float,
     epochs: np.ndarray,
     eclipse_type="Umbra",
+    method="sampled",
 ) -> pd.DataFrame:
     """
     Compute the communications of the spacecraft for a given ground station.
@@ -65,6 +195,9 @@ def compute_eclipses(
         Array of epochs in seconds since J2000
     eclipse_type : string
         Type of eclipse to compute. Can be Umbra or Penumbra. Optional, default is Umbra.
+    method : string
+        Can be sampled, to get the window edges at the sampled epochs, or events, to refine each shadow transition
+        with compute_eclipse_events. Optional, default is sampled.
 
     Returns
     -------
@@ -77,42 +210,187 @@ def compute_eclipses(
          - 'duration' : duration of the communication window
          - 'partial' : True if it is a partial communication window, False if not
     """
+    if method == "events":
+        return compute_eclipse_events(
+            satellite_position,
+            sun_position,
+            sun_radius,
+            earth_radius,
+            epochs,
+            eclipse_type=eclipse_type,
+        )
+    elif method != "sampled":
+        raise ValueError("Method must be sampled or events")
 
     shadow_vector = compute_shadow_vector(
         satellite_position, sun_position, sun_radius, earth_radius
     )
 
-    shadow_df = pd.DataFrame({"epochs": epochs, "shadow": shadow_vector})
     if eclipse_type == "Umbra":
-        shadow_df["bool"] = shadow_df["shadow"] == 0
+        eclipse_vector = shadow_vector == 0
     elif eclipse_type == "Penumbra":
-        shadow_df["bool"] = shadow_df["shadow"] < 1
+        eclipse_vector = shadow_vector < 1
     else:
         raise ValueError("Type must be Umbra or Penumbra")
 
-    # Code steps from https://joshdevlin.com/blog/calculate-streaks-in-pandas/
-    shadow_df["start_bool"] = shadow_df["bool"].ne(shadow_df["bool"].shift(1))
-    shadow_df["end_bool"] = shadow_df["bool"].ne(shadow_df["bool"].shift(-1))
-    shadow_df["streak_id"] = shadow_df["start_bool"].cumsum()
-
-    shadow_df.loc[shadow_df["start_bool"], "start"] = shadow_df["epochs"]
-    shadow_df["start"] = shadow_df["start"].fillna(method="ffill")
-    shadow_df = shadow_df[shadow_df["end_bool"]]
-    shadow_df = shadow_df.rename({"epochs": "end", "bool": "eclipse"}, axis=1)
-    shadow_df = shadow_df[["eclipse", "start", "end"]]
-    shadow_df = shadow_df[shadow_df["eclipse"]].drop("eclipse", axis=1)
-    shadow_df["duration"] = shadow_df["end"] - shadow_df["start"]
-    shadow_df = shadow_df.reset_index(drop=True)
-
-    shadow_df["partial"] = False
-    if shadow_df.shape[0] == 0:
-        return shadow_df
-    if shadow_df.loc[0, "start"] == epochs[0]:
-        shadow_df.loc[0, "partial"] = True
-    if shadow_df.loc[shadow_df.index[-1], "end"] == epochs[-1]:
-        shadow_df.loc[shadow_df.index[-1], "partial"] = True
-
-    shadow_df.rename({"start": "start_epoch", "end": "end_epoch"}, axis=1, inplace=True)
+    shadow_df = get_windows_dataframe(eclipse_vector, epochs)
+    return shadow_df
+
+
+def compute_all_eclipses(
+    satellite_position: np.ndarray,
+    sun_position: np.ndarray,
+    sun_radius: float,
+    earth_radius: float,
+    epochs: np.ndarray,
+):
+    """
+    Compute both the umbra and the penumbra eclipses of the spacecraft from a single evaluation of the shadow vector.
+
+    Parameters
+    ----------
+    satellite_position : ndarray
+        Array of satellite positions in ECI frame
+    sun_position : ndarray
+        Array of sun positions in ECI frame
+    sun_radius : float
+        Sun radius in meters
+    earth_radius : float
+        Earth radius in meters
+    epochs : np.ndarray
+        Array of epochs in seconds since J2000
+
+    Returns
+    -------
+    umbra_df: pd.DataFrame
+        Umbra windows, with the same columns as compute_eclipses plus 'minimum_illumination', the minimum value of
+        the shadow function during the window
+    penumbra_df: pd.DataFrame
+        Penumbra windows, with the same columns as umbra_df
+    """
+    shadow_vector = compute_shadow_vector(
+        satellite_position, sun_position, sun_radius, earth_radius
+    )
+    # Sentinel so that the segment after the last window is always valid for reduceat
+    padded_shadow_vector = np.append(shadow_vector, np.inf)
+
+    eclipses = []
+    for eclipse_vector in [shadow_vector == 0, shadow_vector < 1]:
+        shadow_df = get_windows_dataframe(eclipse_vector, epochs)
+        start_indices, end_indices = get_window_indices(eclipse_vector)
+        if len(start_indices) > 0:
+            segments = np.column_stack((start_indices, end_indices + 1)).ravel()
+            shadow_df["minimum_illumination"] = np.minimum.reduceat(
+                padded_shadow_vector, segments
+            )[::2]
+        else:
+            shadow_df["minimum_illumination"] = pd.Series(dtype=np.float64)
+        eclipses.append(shadow_df)
+    umbra_df, penumbra_df = eclipses
+    return umbra_df, penumbra_df
+
+
+def compute_eclipse_events(
+    satellite_position: np.ndarray,
+    sun_position: np.ndarray,
+    sun_radius: float,
+    earth_radius: float,
+    epochs: np.ndarray,
+    eclipse_type="Umbra",
+    satellite_velocity=None,
+    time_tolerance=1e-3,
+) -> pd.DataFrame:
+    """
+    Compute the eclipses of the spacecraft by detecting the shadow transitions between the sampled epochs and refining
+    each of them with a root-finding on interpolated states. The sampling can be much coarser than the required
+    accuracy on the window edges (e.g. 60 seconds for a LEO orbit), as long as no eclipse is shorter than one step.
+
+    Parameters
+    ----------
+    satellite_position : ndarray
+        Array of satellite positions in ECI frame
+    sun_position : ndarray
+        Array of sun positions in ECI frame
+    sun_radius : float
+        Sun radius in meters
+    earth_radius : float
+        Earth radius in meters
+    epochs : np.ndarray
+        Array of epochs in seconds since J2000
+    eclipse_type : string
+        Type of eclipse to compute. Can be Umbra or Penumbra. Optional, default is Umbra.
+    satellite_velocity : ndarray
+        Array of satellite velocities in ECI frame. If given, the satellite positions are interpolated with a cubic
+        Hermite spline instead of a cubic spline. Optional, default is None.
+    time_tolerance : float
+        Tolerance on the entry and exit epochs in seconds. Optional, default is 1e-3.
+
+    Returns
+    -------
+    shadow_df: pd.DataFrame
+        Returns a data frame containing the following information about the eclipses
+         - 'start' : start date of the eclipse
+         - 'end' : end date of the eclipse
+         - 'start_epoch' : start epoch of the eclipse
+         - 'end_epoch' : end epoch of the eclipse
+         - 'duration' : duration of the eclipse in seconds
+         - 'partial' : True if it is a partial eclipse, False if not
+    """
+    epochs = np.asarray(epochs, dtype=np.float64)
+    satellite_position = np.asarray(satellite_position, dtype=np.float64)
+    sun_position = np.asarray(sun_position, dtype=np.float64)
+    if eclipse_type not in ["Umbra", "Penumbra"]:
+        raise ValueError("Type must be Umbra or Penumbra")
+
+    def event_function(position, sun):
+        # Negative inside the eclipse, positive outside, and smooth across the boundary
+        sun_apparent_radius, earth_apparent_radius, separation = compute_shadow_geometry(
+            position, sun, sun_radius, earth_radius
+        )
+        if eclipse_type == "Umbra":
+            return separation - (earth_apparent_radius - sun_apparent_radius)
+        return separation - (earth_apparent_radius + sun_apparent_radius)
+
+    in_eclipse = event_function(satellite_position, sun_position) < 0
+    transitions = np.flatnonzero(in_eclipse[1:] != in_eclipse[:-1])
+
+    if len(transitions) > 0:
+        if satellite_velocity is None:
+            satellite_interpolator = CubicSpline(epochs, satellite_position, axis=0)
+        else:
+            satellite_interpolator = CubicHermiteSpline(
+                epochs, satellite_position, np.asarray(satellite_velocity), axis=0
+            )
+        sun_interpolator = CubicSpline(epochs, sun_position, axis=0)
+    crossing_epochs = np.array(
+        [
+            brentq(
+                lambda epoch: event_function(
+                    satellite_interpolator([epoch]), sun_interpolator([epoch])
+                )[0],
+                epochs[ii],
+                epochs[ii + 1],
+                xtol=time_tolerance,
+            )
+            for ii in transitions
+        ]
+    )
+
+    start_epochs = crossing_epochs[in_eclipse[transitions + 1]]
+    end_epochs = crossing_epochs[~in_eclipse[transitions + 1]]
+    if len(in_eclipse) > 0 and in_eclipse[0]:
+        start_epochs = np.concatenate(([epochs[0]], start_epochs))
+    if len(in_eclipse) > 0 and in_eclipse[-1]:
+        end_epochs = np.concatenate((end_epochs, [epochs[-1]]))
+
+    shadow_df = pd.DataFrame(
+        {
+            "start_epoch": start_epochs,
+            "end_epoch": end_epochs,
+            "duration": end_epochs - start_epochs,
+            "partial": (start_epochs == epochs[0]) | (end_epochs == epochs[-1]),
+        }
+    )
     shadow_df["start"] = epoch_to_datetime(shadow_df["start_epoch"])
     shadow_df["end"] = epoch_to_datetime(shadow_df["end_epoch"])
 
@@ -120,3 +398,169 @@ def compute_eclipses(
         ["start", "end", "start_epoch", "end_epoch", "duration", "partial"]
     ]
     return shadow_df
+
+
+def compute_sun_position(epochs):
+    """
+    Compute the position of the Sun with the low precision formulas of the Astronomical Almanac (about 0.01 degree
+    of accuracy between 1950 and 2050), without loading any ephemeris.
+
+    Parameters
+    ----------
+    epochs : np.ndarray
+        Array of epochs in seconds since J2000
+
+    Returns
+    -------
+    sun_position : np.ndarray
+        Array of sun positions in ECI frame in meters
+    """
+    days = np.asarray(epochs, dtype=np.float64) / 86400
+    mean_longitude = np.deg2rad(280.460 + 0.9856474 * days)
+    mean_anomaly = np.deg2rad(357.528 + 0.9856003 * days)
+    ecliptic_longitude = (
+        mean_longitude
+        + np.deg2rad(1.915) * np.sin(mean_anomaly)
+        + np.deg2rad(0.020) * np.sin(2 * mean_anomaly)
+    )
+    obliquity = np.deg2rad(23.439 - 0.0000004 * days)
+    distance = (
+        1.00014 - 0.01671 * np.cos(mean_anomaly) - 0.00014 * np.cos(2 * mean_anomaly)
+    ) * ASTRONOMICAL_UNIT
+    sun_position = np.column_stack(
+        (
+            np.cos(ecliptic_longitude),
+            np.cos(obliquity) * np.sin(ecliptic_longitude),
+            np.sin(obliquity) * np.sin(ecliptic_longitude),
+        )
+    )
+    return sun_position * distance[:, None]
+
+
+def compute_mean_eclipses(
+    epochs: np.ndarray,
+    semi_major_axis: np.ndarray,
+    inclination: np.ndarray,
+    raan: np.ndarray,
+    sun_position: np.ndarray,
+    sun_radius: float,
+    earth_radius: float,
+    gravitational_parameter: float,
+    eclipse_type="Umbra",
+    eccentricity=None,
+    argument_of_periapsis=None,
+) -> pd.DataFrame:
+    """
+    Estimate the beta angle and the eclipse duration of each orbit analytically from mean keplerian elements, assuming
+    a Sun direction constant over one orbit. Eccentric orbits are handled with the radius and the angular rate at the
+    middle of the eclipse. The umbra (or penumbra) is modelled as a cone, so a
+    10-year profile only needs one set of mean elements per orbit, e.g. from a sparse propagation or from STELA.
+
+    Parameters
+    ----------
+    epochs : np.ndarray
+        Array of epochs in seconds since J2000
+    semi_major_axis : np.ndarray
+        Mean semi-major axis in meters
+    inclination : np.ndarray
+        Mean inclination in radians
+    raan : np.ndarray
+        Mean right ascension of the ascending node in radians
+    sun_position : np.ndarray
+        Array of sun positions in ECI frame
+    sun_radius : float
+        Sun radius in meters
+    earth_radius : float
+        Earth radius in meters
+    gravitational_parameter : float
+        Gravitational parameter of the Earth in m^3/s^2
+    eclipse_type : string
+        Type of eclipse to compute. Can be Umbra or Penumbra. Optional, default is Umbra.
+    eccentricity : np.ndarray
+        Mean eccentricity. Optional, default is None (circular orbit).
+    argument_of_periapsis : np.ndarray
+        Mean argument of periapsis in radians, required if eccentricity is given. Optional, default is None.
+
+    Returns
+    -------
+    eclipses_df: pd.DataFrame
+        Returns a data frame containing the following information for each set of mean elements
+         - 'epoch' : epoch in seconds since J2000
+         - 'beta_angle' : angle between the orbital plane and the Sun direction in radians
+         - 'period' : orbital period in seconds
+         - 'duration' : duration of the eclipse in seconds
+         - 'fraction' : fraction of the orbit spent in eclipse
+    """
+    semi_major_axis = np.asarray(semi_major_axis, dtype=np.float64)
+    inclination = np.asarray(inclination, dtype=np.float64)
+    raan = np.asarray(raan, dtype=np.float64)
+    sun_position = np.asarray(sun_position, dtype=np.float64)
+
+    sun_distance = np.linalg.norm(sun_position, axis=1)
+    sun_direction = sun_position / sun_distance[:, None]
+    orbit_normal = np.column_stack(
+        (
+            np.sin(inclination) * np.sin(raan),
+            -np.sin(inclination) * np.cos(raan),
+            np.cos(inclination),
+        )
+    )
+    beta_angle = np.arcsin(
+        np.clip(np.einsum("ij,ij->i", orbit_normal, sun_direction), -1.0, 1.0)
+    )
+    period = 2 * np.pi * np.sqrt(semi_major_axis**3 / gravitational_parameter)
+
+    if eccentricity is None:
+        radius = semi_major_axis
+        angular_rate = 2 * np.pi / period
+    else:
+        eccentricity = np.asarray(eccentricity, dtype=np.float64)
+        # Argument of latitude of the middle of the eclipse (projection of the anti-Sun direction on the orbit)
+        node_direction = np.column_stack((np.cos(raan), np.sin(raan), np.zeros_like(raan)))
+        in_plane_direction = np.cross(orbit_normal, node_direction)
+        shadow_latitude_argument = np.arctan2(
+            -np.einsum("ij,ij->i", in_plane_direction, sun_direction),
+            -np.einsum("ij,ij->i", node_direction, sun_direction),
+        )
+        semi_latus_rectum = semi_major_axis * (1 - eccentricity**2)
+        radius = semi_latus_rectum / (
+            1
+            + eccentricity
+            * np.cos(shadow_latitude_argument - np.asarray(argument_of_periapsis))
+        )
+        angular_rate = (
+            np.sqrt(gravitational_parameter * semi_latus_rectum) / radius**2
+        )
+
+    # Radius of the shadow cone at the distance of the satellite behind the Earth, along the shadow axis
+    shadow_axis_distance = radius * np.cos(beta_angle)
+    if eclipse_type == "Umbra":
+        shadow_radius = (
+            earth_radius
+            - shadow_axis_distance * (sun_radius - earth_radius) / sun_distance
+        )
+    elif eclipse_type == "Penumbra":
+        shadow_radius = (
+            earth_radius
+            + shadow_axis_distance * (sun_radius + earth_radius) / sun_distance
+        )
+    else:
+        raise ValueError("Type must be Umbra or Penumbra")
+
+    # The satellite is in the shadow when its distance to the shadow axis is below the shadow radius
+    cos_half_angle = np.sqrt(np.clip(radius**2 - shadow_radius**2, 0, None)) / (
+        radius * np.cos(beta_angle)
+    )
+    half_angle = np.arccos(np.clip(cos_half_angle, -1.0, 1.0))
+    duration = 2 * half_angle / angular_rate
+
+    eclipses_df = pd.DataFrame(
+        {
+            "epoch": np.asarray(epochs, dtype=np.float64),
+            "beta_angle": beta_angle,
+            "period": period,
+            "duration": duration,
+            "fraction": duration / period,
+        }
+    )
+    return eclipses_df
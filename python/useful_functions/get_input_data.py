@@ -3,7 +3,14 @@ from datetime import datetime, timezone
 from datetime import timedelta
 from pathlib import Path
 
+import pandas as pd
+
 input_data_path = str(Path(__file__).parents[1].joinpath("input_data"))
+satnogs_stations_path = str(
+    Path(__file__).parents[2].joinpath(
+        "celestlab", "SATNOGS", "ground-stations-GPS-extended.csv"
+    )
+)
 
 
 def get_spacecraft(filename):
@@ -34,6 +41,59 @@ def get_station(filename):
     return station
 
 
+def get_station_network(path=satnogs_stations_path, online_only=False):
+    """
+    Import a network of ground stations from a CSV file, by default the SatNOGS stations of celestlab/SATNOGS.
+
+    Parameters
+    ----------
+    path : str, optional
+        Path to the CSV file, with one station per row
+    online_only : bool, optional
+        Keep only the stations flagged as online, by default False
+
+    Returns
+    -------
+    stations : pd.DataFrame
+        Data frame with the columns 'name' (made unique), 'longitude', 'latitude', 'altitude', 'minimum_elevation'
+        and 'online'
+    """
+    stations = pd.read_csv(path, encoding="utf_8_sig").rename(
+        columns={
+            "longitude (deg)": "longitude",
+            "latitude (deg)": "latitude",
+            "altitude (meters)": "altitude",
+            "minimum horizon (deg)": "minimum_elevation",
+            "status (1 for Online)": "online",
+        }
+    )
+    stations["online"] = stations["online"] == 1
+    # Stations sharing a name are told apart by a suffix, e.g. "UY0LL" and "UY0LL-2"
+    duplicates = stations.groupby("name").cumcount()
+    suffixes = "-" + (duplicates[duplicates > 0] + 1).astype(str)
+    stations.loc[duplicates > 0, "name"] += suffixes
+    stations = stations[
+        ["name", "longitude", "latitude", "altitude", "minimum_elevation", "online"]
+    ]
+    if online_only:
+        stations = stations[stations["online"]]
+    return stations.reset_index(drop=True)
+
+
+def get_link_budget(filename):
+    """
+    Import link budget data from a CSV file.
+    """
+    with open(
+        input_data_path + "/link_budgets/" + filename + ".csv",
+        mode="r",
+        encoding="utf_8_sig",
+    ) as inp:
+        reader = csv.reader(inp)
+        link_budget = {rows[0]: float(rows[1]) for rows in reader}
+    return link_budget
+
+
 def get_orbit(filename):
     """
     Import orbit data from a CSV file.
@@ -0,0 +1,238 @@
+import numpy as np
+import pandas as pd
+
+from useful_functions.doppler import (
+    compute_doppler_visibility_arrays,
+    compute_gravity_acceleration,
+    compute_link_candidates,
+)
+from useful_functions.get_input_data import get_spacecraft
+from useful_functions.state_store import STATE_COLUMNS
+from useful_functions.windows import compute_adaptive_mask, get_windows_dataframe
+
+# Part of the names of the satellites of each constellation, as in the TLEs from CelesTrak
+CONSTELLATION_KEYWORDS = {
+    "GPS": "GPS",
+    "Galileo": "GSAT",
+    "Glonass": "COSMOS",
+    "Iridium": "IRIDIUM",
+}
+
+BODY_AXES = {"X": 0, "Y": 1, "Z": 2}
+
+
+def get_link_profile(
+    constellation,
+    receiver="Tolosat",
+    antennas=("+Z",),
+    selected_satellite=None,
+    link_condition=None,
+):
+    """
+    Build the profile of the links between a receiver and the satellites of a constellation from the spacecraft
+    input data.
+
+    The constellation file gives the 'antenna_half_angle' of its satellites, the emitted 'frequency', the
+    'doppler_shift_limit', the 'doppler_rate_limit' and optionally the 'max_distance' of the links. The receiver file
+    gives the half-angle of its antennas for this constellation, e.g. 'gps_antenna_half_angle'.
+
+    Parameters
+    ----------
+    constellation : str
+        Name of the constellation file in input_data/spacecraft, one of the keys of CONSTELLATION_KEYWORDS
+    receiver : str, optional
+        Name of the receiver file in input_data/spacecraft, by default "Tolosat"
+    antennas : tuple of str, optional
+        Body axes along which the antennas of the receiver point, among "+X", "-X", "+Y", "-Y", "+Z" and "-Z",
+        by default ("+Z",)
+    selected_satellite : str, optional
+        Name of a satellite whose angles and Doppler are returned in detail, by default None
+    link_condition : callable, optional
+        Additional condition of the links, function of the distances in meters returning a mask, by default None
+
+    Returns
+    -------
+    profile : dict
+        Profile of the links, as used by compute_link_visibility
+    """
+    if constellation not in CONSTELLATION_KEYWORDS:
+        raise ValueError(
+            f"constellation must be one of {list(CONSTELLATION_KEYWORDS.keys())}"
+        )
+    for antenna in antennas:
+        if len(antenna) != 2 or antenna[0] not in "+-" or antenna[1] not in BODY_AXES:
+            raise ValueError("antennas must be body axes such as +X or -Z")
+    emitter_data = get_spacecraft(constellation)
+    receiver_data = get_spacecraft(receiver)
+    return {
+        "name": constellation,
+        "keyword": CONSTELLATION_KEYWORDS[constellation],
+        "receiver": receiver,
+        "antennas": list(antennas),
+        "frequency": emitter_data["frequency"],
+        "doppler_shift_limit": emitter_data["doppler_shift_limit"],
+        "doppler_rate_limit": emitter_data["doppler_rate_limit"],
+        "max_distance": emitter_data.get("max_distance"),
+        "receiver_half_angle": receiver_data[
+            f"{constellation.lower()}_antenna_half_angle"
+        ],
+        "emitter_half_angle": emitter_data["antenna_half_angle"],
+        "selected_satellite": selected_satellite,
+        "link_condition": link_condition,
+    }
+
+
+def get_antenna_vectors(body_vectors, antennas):
+    """
+    Get the pointing directions of antennas from the body vectors of the receiver
+
+    Parameters
+    ----------
+    body_vectors : tuple of np.ndarray of shape (t, 3)
+        X, Y and Z body vectors of the receiver, as returned by compute_body_vectors
+    antennas : list of str
+        Body axes along which the antennas point, e.g. ["+Z"] or ["+X", "-X"]
+
+    Returns
+    -------
+    antenna_vectors : list of np.ndarray of shape (t, 3)
+        Pointing directions of the antennas
+    """
+    return [
+        (1 if antenna[0] == "+" else -1) * body_vectors[BODY_AXES[antenna[1]]]
+        for antenna in antennas
+    ]
+
+
+def compute_link_visibility(
+    results_dict, body_vectors, profiles, window_accumulators=None, coarse_step=None
+):
+    """
+    Compute the visibility of the satellites of several constellations from the receiver over one propagation chunk.
+
+    The epochs, the receiver states and its antenna directions are shared by all the profiles, so that a combined
+    study of several constellations only computes them once.
+
+    Parameters
+    ----------
+    results_dict : dict
+        Results of the chunk, with 'epochs', the receiver and the satellites, as returned by get_lazy_results_dict
+        (possibly merged from the stores of several constellations)
+    body_vectors : tuple of np.ndarray of shape (t, 3)
+        X, Y and Z body vectors of the receiver, as returned by compute_body_vectors
+    profiles : list of dict
+        Profiles of the links, as returned by get_link_profile
+    window_accumulators : dict of WindowAccumulator, optional
+        Accumulator of the windows of each profile name when the chunks of a mission are processed one after the
+        other, by default None (the windows of the chunk are returned as they are)
+    coarse_step : int, optional
+        Number of samples between two evaluations of the link conditions, only refined to every sample around the
+        changes of visibility with compute_adaptive_mask, by default None (the conditions are evaluated at every
+        sample). The visibility is the same as long as no satellite is visible, or hidden, for less than coarse_step
+        samples, which links grazing the Earth limb, an antenna cone or the max_distance break within seconds.
+
+    Returns
+    -------
+    links : dict
+        For each profile name, a tuple of data frames:
+         - visibility : epochs at which at least one satellite is visible, with one boolean column per satellite and
+           'sum_ok', the number of visible satellites
+         - windows : windows during which at least one satellite is visible, as returned by get_windows_dataframe,
+           or the windows closed in this chunk with window_accumulators
+         - sat_results : epochs, angles and Doppler of the selected satellite
+    """
+    epochs = results_dict["epochs"].to_numpy()
+    receiver_states = {}
+    receiver_accelerations = {}
+    links = {}
+    for profile in profiles:
+        receiver = profile["receiver"]
+        if receiver not in receiver_states:
+            receiver_states[receiver] = results_dict[receiver][STATE_COLUMNS].to_numpy()
+            receiver_accelerations[receiver] = compute_gravity_acceleration(
+                receiver_states[receiver][:, :3]
+            )
+        sat_names = [sat for sat in results_dict if profile["keyword"] in sat]
+        satellites_states = np.stack(
+            [results_dict[sat][STATE_COLUMNS].to_numpy() for sat in sat_names], axis=1
+        )
+        antenna_vectors = get_antenna_vectors(body_vectors, profile["antennas"])
+
+        def compute_links(time_indices, emitter_states):
+            doppler = compute_doppler_visibility_arrays(
+                epochs[time_indices],
+                receiver_states[receiver][time_indices],
+                emitter_states,
+                [vector[time_indices] for vector in antenna_vectors],
+                profile["frequency"],
+                profile["doppler_shift_limit"],
+                profile["doppler_rate_limit"],
+                profile["receiver_half_angle"],
+                profile["emitter_half_angle"],
+                max_distance=profile["max_distance"],
+                receiver_accelerations=receiver_accelerations[receiver][time_indices],
+            )
+            if profile["link_condition"] is not None:
+                doppler["all_OK"] &= profile["link_condition"](doppler["distance"])
+            return doppler
+
+        def evaluate_links(time_indices, satellite_indices):
+            # Only the links passing the geometric test reach the Doppler kernel
+            emitter_states = satellites_states[time_indices, satellite_indices]
+            all_ok = compute_link_candidates(
+                receiver_states[receiver][time_indices, :3],
+                emitter_states[:, :3],
+                profile["max_distance"],
+                [vector[time_indices] for vector in antenna_vectors],
+                profile["receiver_half_angle"],
+                profile["emitter_half_angle"],
+            )
+            candidates = np.flatnonzero(all_ok)
+            all_ok[candidates] = compute_links(
+                time_indices[candidates], emitter_states[candidates, None]
+            )["all_OK"][:, 0]
+            return all_ok
+
+        if coarse_step is None:
+            all_ok = compute_link_candidates(
+                receiver_states[receiver][:, None, :3],
+                satellites_states[:, :, :3],
+                profile["max_distance"],
+                [vector[:, None] for vector in antenna_vectors],
+                profile["receiver_half_angle"],
+                profile["emitter_half_angle"],
+            )
+            time_indices, satellite_indices = np.nonzero(all_ok)
+            all_ok[time_indices, satellite_indices] = compute_links(
+                time_indices, satellites_states[time_indices, satellite_indices, None]
+            )["all_OK"][:, 0]
+        else:
+            all_ok = compute_adaptive_mask(
+                evaluate_links, satellites_states.shape[:2], coarse_step
+            )
+
+        visibility = pd.DataFrame(all_ok, columns=sat_names)
+        visibility.insert(0, "epochs", epochs)
+        visibility["sum_ok"] = all_ok.sum(axis=1)
+        if window_accumulators is None:
+            windows = get_windows_dataframe(visibility["sum_ok"] > 0, epochs)
+        else:
+            windows = window_accumulators[profile["name"]].add_chunk(
+                visibility["sum_ok"] > 0, epochs
+            )
+        visibility = visibility[visibility["sum_ok"] > 0]
+
+        sat_results = pd.DataFrame({"epochs": epochs})
+        if profile["selected_satellite"] in sat_names:
+            selected_index = sat_names.index(profile["selected_satellite"])
+            doppler = compute_links(slice(None), satellites_states[:, [selected_index]])
+            for i, angles in enumerate(doppler["receiver_angles"]):
+                sat_results[f"tolosat_angle_{i + 1}"] = angles[:, 0]
+            sat_results[f"{profile['name'].lower()}_angle"] = doppler["emitter_angle"][
+                :, 0
+            ]
+            sat_results["doppler_shift"] = doppler["doppler_shift"][:, 0]
+            sat_results["doppler_rate"] = doppler["doppler_rate"][:, 0]
+
+        links[profile["name"]] = (visibility, windows, sat_results)
+    return links
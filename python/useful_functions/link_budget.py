@@ -0,0 +1,140 @@
+import numpy as np
+
+from useful_functions.get_input_data import get_link_budget
+
+BOLTZMANN_CONSTANT_DB = 10 * np.log10(1.380649e-23)  # dB(J/K)
+LINK_DIRECTIONS = ["uplink", "downlink"]
+LINK_CASES = ["typical", "worst"]
+
+
+def get_link_budget_profile(direction="downlink", case="typical", band="s_band"):
+    """
+    Get the constants of the link budget between TOLOSAT and the ground station, provided by the telemetry subsystem,
+    from input_data/link_budgets.
+
+    Parameters
+    ----------
+    direction : str, optional
+        "uplink" or "downlink", by default "downlink"
+    case : str, optional
+        Hardware case, "typical" or "worst", by default "typical"
+    band : str, optional
+        Frequency band, by default "s_band"
+
+    Returns
+    -------
+    profile : dict
+        Constants of the link budget, with the 'direction' of the link
+    """
+    if direction not in LINK_DIRECTIONS:
+        raise ValueError(f"direction must be one of {LINK_DIRECTIONS}")
+    if case not in LINK_CASES:
+        raise ValueError(f"case must be one of {LINK_CASES}")
+    profile = get_link_budget(f"{band}_{direction}_{case}")
+    profile["direction"] = direction
+    return profile
+
+
+def compute_propagation_losses(profile, distance, elevation=None):
+    """
+    Compute the free space, atmospheric and polarization losses of a link.
+
+    Parameters
+    ----------
+    profile : dict
+        Constants of the link budget, as returned by get_link_budget_profile
+    distance : np.ndarray
+        Distances between TOLOSAT and the ground station in meters
+    elevation : np.ndarray, optional
+        Elevations of TOLOSAT above the horizon of the ground station in degrees, by default None (atmospheric losses
+        at zenith). The atmospheric losses of the profile, given at zenith, are scaled by 1 / sin(elevation) above
+        5 degrees of elevation.
+
+    Returns
+    -------
+    losses : np.ndarray
+        Propagation losses in dB
+    """
+    distance = np.asarray(distance, dtype=np.float64)
+    free_space_losses = (
+        20 * (np.log10(distance / 1e3) + np.log10(profile["frequency"] / 1e9)) + 92.45
+    )
+    atmospheric_losses = profile["atmospheric_losses"]
+    if elevation is not None:
+        atmospheric_losses = atmospheric_losses / np.sin(
+            np.deg2rad(np.maximum(elevation, 5))
+        )
+    return free_space_losses + atmospheric_losses + profile["polarization_losses"]
+
+
+def compute_link_margin(profile, distance, elevation=None):
+    """
+    Compute the margin of the link budget between TOLOSAT and the ground station for arrays of geometries.
+
+    For the uplink, the margin is the received power above the sensitivity of TOLOSAT. For the downlink, it is the
+    received Eb/N0 above the required Eb/N0 of the ground station.
+
+    Parameters
+    ----------
+    profile : dict
+        Constants of the link budget, as returned by get_link_budget_profile
+    distance : np.ndarray
+        Distances between TOLOSAT and the ground station in meters
+    elevation : np.ndarray, optional
+        Elevations of TOLOSAT above the horizon of the ground station in degrees, by default None (atmospheric losses
+        at zenith)
+
+    Returns
+    -------
+    margin : np.ndarray
+        Margin of the link in dB, of the shape of distance
+    """
+    propagation_losses = compute_propagation_losses(profile, distance, elevation)
+    mismatch_losses = -10 * np.log10(
+        1 - 1 / 10 ** (-profile["reflection_coefficient"] / 10)
+    )
+    if profile["direction"] == "uplink":
+        received_power = (
+            profile["eirp"]
+            + 30
+            - propagation_losses
+            + profile["gain"]
+            - mismatch_losses
+            - profile["circuit_losses"]
+        )  # dBm
+        return received_power - profile["sensitivity"]
+
+    eirp = (
+        profile["transmission_power"]
+        - profile["circuit_losses"]
+        - mismatch_losses
+        + profile["gain"]
+    )  # dBW
+    received_power = eirp + 30 - propagation_losses  # dBm
+    c_over_n0 = profile["g_over_t"] + received_power - BOLTZMANN_CONSTANT_DB
+    received_eb_over_n0 = (
+        c_over_n0 - profile["demodulator_losses"] - 10 * np.log10(profile["bitrate"])
+    )
+    return received_eb_over_n0 - profile["required_eb_over_n0"]
+
+
+def can_communicate(profile, distance, elevation=None):
+    """
+    Check whether the link budget between TOLOSAT and the ground station closes with the required margin, which is
+    high because of the uncertainty on the components.
+
+    Parameters
+    ----------
+    profile : dict
+        Constants of the link budget, as returned by get_link_budget_profile
+    distance : np.ndarray
+        Distances between TOLOSAT and the ground station in meters
+    elevation : np.ndarray, optional
+        Elevations of TOLOSAT above the horizon of the ground station in degrees, by default None
+
+    Returns
+    -------
+    mask : np.ndarray
+        True where the margin is above the 'required_margin' of the profile
+    """
+    return compute_link_margin(profile, distance, elevation) > profile["required_margin"]
@@ -0,0 +1,152 @@
+import json
+from os import makedirs, path as os_path
+from shutil import rmtree
+
+import numpy as np
+import pandas as pd
+
+
+RESULTS_STORE_INDEX = "index.json"
+
+
+def create_results_store(path):
+    """
+    Create an empty results store, replacing any previous store at the same path.
+
+    A results store is a folder holding data frames built chunk by chunk (for instance the visibility of each
+    propagation day), stored column by column:
+     - 'index.json' : for each data frame, its number of rows and the name and dtype of its columns
+     - '{frame}_{column number}.bin' : raw values of one column, the values of each new chunk being appended at the
+       end of the file
+
+    Appending a chunk only writes the chunk, so the cost of building a data frame is linear in the number of chunks
+    and the rows do not have to be kept in memory.
+
+    Parameters
+    ----------
+    path : str
+        Path to the folder of the store
+    """
+    if os_path.isdir(path):
+        rmtree(path)
+    makedirs(path)
+    write_results_store_index(path, {})
+
+
+def get_results_store_index(path):
+    """
+    Read the index of a results store
+
+    Parameters
+    ----------
+    path : str
+        Path to the folder of the store
+
+    Returns
+    -------
+    index : dict
+        For each data frame name, a dictionary with keys 'length' and 'columns' (column names and dtypes)
+    """
+    with open(os_path.join(path, RESULTS_STORE_INDEX), "r") as f:
+        return json.load(f)
+
+
+def write_results_store_index(path, index):
+    """
+    Write the index of a results store
+
+    Parameters
+    ----------
+    path : str
+        Path to the folder of the store
+    index : dict
+        For each data frame name, a dictionary with keys 'length' and 'columns' (column names and dtypes)
+    """
+    with open(os_path.join(path, RESULTS_STORE_INDEX), "w") as f:
+        json.dump(index, f, indent=1)
+
+
+def append_results(path, frame_name, frame):
+    """
+    Append the rows of a chunk to a data frame of a results store. The index of the chunk is ignored.
+
+    Parameters
+    ----------
+    path : str
+        Path to the folder of the store, created with create_results_store
+    frame_name : str
+        Name of the data frame, e.g. "visibility"
+    frame : pd.DataFrame
+        Rows of the chunk, with numeric or boolean columns. The first chunk sets the columns of the data frame: in the
+        next chunks, missing float columns are filled with NaN and extra columns are dropped.
+    """
+    index = get_results_store_index(path)
+    frame = frame.rename(columns=str)
+    if frame_name not in index:
+        for column in frame.columns:
+            if frame[column].dtype.kind not in "biuf":
+                raise ValueError(f"Column {column} is not numeric or boolean")
+        index[frame_name] = {
+            "length": 0,
+            "columns": [[column, frame[column].dtype.str] for column in frame.columns],
+        }
+    else:
+        # Columns missing from the chunk (e.g. a satellite absent from it) are filled with NaN, extra columns are
+        # dropped, and the values are cast to the dtypes of the data frame
+        columns = dict(index[frame_name]["columns"])
+        for column, dtype in columns.items():
+            if column not in frame.columns and np.dtype(dtype).kind != "f":
+                raise ValueError(f"Column {column} of {frame_name} is missing")
+        frame = frame.reindex(columns=list(columns)).astype(columns)
+
+    for column_number, column in enumerate(frame.columns):
+        column_path = os_path.join(path, f"{frame_name}_{column_number:03d}.bin")
+        with open(column_path, "ab") as f:
+            frame[column].to_numpy().tofile(f)
+    index[frame_name]["length"] += len(frame)
+    write_results_store_index(path, index)
+
+
+def read_results(path, frame_name, columns=None):
+    """
+    Read a data frame of a results store. The columns are memory-mapped, so only the requested ones are read.
+
+    Parameters
+    ----------
+    path : str
+        Path to the folder of the store
+    frame_name : str
+        Name of the data frame
+    columns : list of str, optional
+        Names of the columns to read, by default all of them
+
+    Returns
+    -------
+    frame : pd.DataFrame
+        Rows of all the chunks appended to the data frame
+    """
+    index = get_results_store_index(path)
+    if frame_name not in index:
+        raise ValueError(f"No data frame {frame_name} in the store")
+    length = index[frame_name]["length"]
+    all_columns = [column[0] for column in index[frame_name]["columns"]]
+    if columns is None:
+        columns = all_columns
+    missing_columns = [column for column in columns if column not in all_columns]
+    if missing_columns:
+        raise ValueError(f"Columns not in {frame_name}: {missing_columns}")
+
+    frame = {}
+    for column in columns:
+        column_number = all_columns.index(column)
+        dtype = np.dtype(index[frame_name]["columns"][column_number][1])
+        if length == 0:
+            frame[column] = np.empty(0, dtype=dtype)
+        else:
+            frame[column] = np.memmap(
+                os_path.join(path, f"{frame_name}_{column_number:03d}.bin"),
+                dtype=dtype,
+                mode="r",
+                shape=(length,),
+            )
+    return pd.DataFrame(frame, columns=columns)
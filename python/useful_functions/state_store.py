@@ -0,0 +1,409 @@
+import json
+from os import makedirs, path as os_path
+from shutil import rmtree
+
+import numpy as np
+import pandas as pd
+
+
+STATE_STORE_INDEX = "index.json"
+STATE_COLUMNS = ["x", "y", "z", "vx", "vy", "vz"]
+
+
+def create_state_store(path, spacecraft_names):
+    """
+    Create an empty state store, replacing any previous store at the same path.
+
+    A state store is a folder holding the results of a chunked propagation (for instance one chunk per day):
+     - 'index.json' : names of the spacecraft and, for each chunk, its name, length and first and last epochs
+     - '{chunk}_epochs.npy' : epochs of the chunk in seconds since J2000, of shape (n,)
+     - '{chunk}_states.npy' : states of all spacecraft in meters and meters per second, stored satellite by satellite
+       with shape (s, n, 6) so that one satellite can be read without reading the others
+     - '{chunk}_sun_direction.npy' : Sun directions from the first spacecraft, of shape (n, 3)
+
+    Parameters
+    ----------
+    path : str
+        Path to the folder of the store
+    spacecraft_names : list of str
+        Names of the spacecraft, in the order of the states
+    """
+    if os_path.isdir(path):
+        rmtree(path)
+    makedirs(path)
+    write_state_store_index(
+        path, {"spacecraft_names": list(spacecraft_names), "chunks": []}
+    )
+
+
+def get_state_store_index(path):
+    """
+    Read the index of a state store
+
+    Parameters
+    ----------
+    path : str
+        Path to the folder of the store
+
+    Returns
+    -------
+    index : dict
+        Index of the store, with keys 'spacecraft_names' and 'chunks'
+    """
+    with open(os_path.join(path, STATE_STORE_INDEX), "r") as f:
+        return json.load(f)
+
+
+def write_state_store_index(path, index):
+    """
+    Write the index of a state store
+
+    Parameters
+    ----------
+    path : str
+        Path to the folder of the store
+    index : dict
+        Index of the store, with keys 'spacecraft_names' and 'chunks'
+    """
+    with open(os_path.join(path, STATE_STORE_INDEX), "w") as f:
+        json.dump(index, f, indent=1)
+
+
+def append_state_chunk(path, epochs, states, sun_directions):
+    """
+    Append the results of one propagation chunk to a state store
+
+    Parameters
+    ----------
+    path : str
+        Path to the folder of the store, created with create_state_store
+    epochs : np.ndarray of shape (n,)
+        Epochs in seconds since J2000
+    states : np.ndarray of shape (n, 6 * s) or (n, s, 6)
+        States of the s spacecraft in meters and meters per second, in the order of the spacecraft names of the store
+    sun_directions : np.ndarray of shape (n, 3)
+        Sun directions from the first spacecraft
+    """
+    index = get_state_store_index(path)
+    epochs = np.asarray(epochs, dtype=np.float64)
+    states = np.asarray(states, dtype=np.float64).reshape(len(epochs), -1, 6)
+    if states.shape[1] != len(index["spacecraft_names"]):
+        raise ValueError("states must contain one state per spacecraft of the store")
+
+    chunk_name = f"{len(index['chunks']):05d}"
+    np.save(os_path.join(path, f"{chunk_name}_epochs.npy"), epochs)
+    np.save(
+        os_path.join(path, f"{chunk_name}_states.npy"),
+        np.ascontiguousarray(states.transpose(1, 0, 2)),
+    )
+    np.save(
+        os_path.join(path, f"{chunk_name}_sun_direction.npy"),
+        np.asarray(sun_directions, dtype=np.float64),
+    )
+    index["chunks"].append(
+        {
+            "name": chunk_name,
+            "length": len(epochs),
+            "start_epoch": float(epochs[0]),
+            "end_epoch": float(epochs[-1]),
+        }
+    )
+    write_state_store_index(path, index)
+
+
+def read_state_store(
+    path,
+    spacecraft_names=None,
+    start_epoch=None,
+    end_epoch=None,
+    chunks=None,
+):
+    """
+    Read a slice of a state store, by spacecraft and by time range
+
+    Only the chunks overlapping the time range are opened, and they are memory-mapped so that only the requested
+    spacecraft and epochs are read from the disk. The last epoch of a chunk is usually the first epoch of the next
+    one, so epochs already read from a previous chunk are skipped.
+
+    Parameters
+    ----------
+    path : str
+        Path to the folder of the store
+    spacecraft_names : list of str, optional
+        Names of the spacecraft to read, by default all of them
+    start_epoch : float, optional
+        First epoch to read in seconds since J2000, by default the first epoch of the store
+    end_epoch : float, optional
+        Last epoch to read in seconds since J2000, by default the last epoch of the store
+    chunks : list of int, optional
+        Indices of the chunks to read, by default all of them
+
+    Returns
+    -------
+    epochs : np.ndarray of shape (t,)
+        Epochs in seconds since J2000
+    states : np.ndarray of shape (t, s, 6)
+        States of the requested spacecraft in meters and meters per second
+    sun_directions : np.ndarray of shape (t, 3)
+        Sun directions from the first spacecraft of the store
+    """
+    index = get_state_store_index(path)
+    all_names = index["spacecraft_names"]
+    if spacecraft_names is None:
+        spacecraft_names = all_names
+    missing_names = [name for name in spacecraft_names if name not in all_names]
+    if missing_names:
+        raise ValueError(f"Spacecraft not in the store: {missing_names}")
+    satellite_indices = [all_names.index(name) for name in spacecraft_names]
+    start_epoch = -np.inf if start_epoch is None else start_epoch
+    end_epoch = np.inf if end_epoch is None else end_epoch
+    chunk_list = (
+        index["chunks"] if chunks is None else [index["chunks"][i] for i in chunks]
+    )
+
+    epochs, states, sun_directions = [], [], []
+    last_epoch = -np.inf
+    for chunk in chunk_list:
+        if chunk["end_epoch"] < start_epoch or chunk["start_epoch"] > end_epoch:
+            continue
+        chunk_path = os_path.join(path, chunk["name"])
+        chunk_epochs = np.load(f"{chunk_path}_epochs.npy")
+        first = np.searchsorted(
+            chunk_epochs, max(start_epoch, np.nextafter(last_epoch, np.inf))
+        )
+        last = np.searchsorted(chunk_epochs, end_epoch, side="right")
+        if first >= last:
+            continue
+        chunk_states = np.load(f"{chunk_path}_states.npy", mmap_mode="r")
+        chunk_sun_directions = np.load(f"{chunk_path}_sun_direction.npy", mmap_mode="r")
+        epochs.append(chunk_epochs[first:last])
+        states.append(chunk_states[satellite_indices, first:last])
+        sun_directions.append(chunk_sun_directions[first:last])
+        last_epoch = chunk_epochs[last - 1]
+
+    if not epochs:
+        return np.empty(0), np.empty((0, len(satellite_indices), 6)), np.empty((0, 3))
+    return (
+        np.concatenate(epochs),
+        np.ascontiguousarray(np.concatenate(states, axis=1).transpose(1, 0, 2)),
+        np.concatenate(sun_directions),
+    )
+
+
+def state_stores_match(path, reference_path, spacecraft_names=None):
+    """
+    Check from their indexes that two state stores can be compared with compare_state_stores: same chunks, with the
+    same lengths and first and last epochs, and the spacecraft to compare in both stores.
+
+    Parameters
+    ----------
+    path : str
+        Path to the folder of the store
+    reference_path : str
+        Path to the folder of the reference store
+    spacecraft_names : list of str, optional
+        Names of the spacecraft to compare, by default all the spacecraft of the store
+
+    Returns
+    -------
+    match : bool
+        True if the stores can be compared, False if the reference store is missing or was propagated over other dates
+        or for other spacecraft
+    """
+    if not os_path.exists(os_path.join(reference_path, STATE_STORE_INDEX)):
+        return False
+    index = get_state_store_index(path)
+    reference_index = get_state_store_index(reference_path)
+    if spacecraft_names is None:
+        spacecraft_names = index["spacecraft_names"]
+    chunks, reference_chunks = (
+        [
+            (chunk["length"], chunk["start_epoch"], chunk["end_epoch"])
+            for chunk in store_index["chunks"]
+        ]
+        for store_index in (index, reference_index)
+    )
+    return (
+        set(spacecraft_names) <= set(reference_index["spacecraft_names"])
+        and chunks == reference_chunks
+    )
+
+
+def compare_state_stores(path, reference_path, spacecraft_names=None):
+    """
+    Compare the states of the spacecraft of a state store to those of a reference store with the same epochs, for
+    instance constellation ephemerides computed with SGP4 to numerically integrated ones. The stores are read chunk by
+    chunk.
+
+    Parameters
+    ----------
+    path : str
+        Path to the folder of the store
+    reference_path : str
+        Path to the folder of the reference store
+    spacecraft_names : list of str, optional
+        Names of the spacecraft to compare, by default all the spacecraft of the store
+
+    Returns
+    -------
+    differences : pd.DataFrame
+        Data frame indexed by spacecraft name, with the maximum and root mean square differences of position (in
+        meters) and velocity (in meters per second): 'max_position', 'rms_position', 'max_velocity', 'rms_velocity'
+    """
+    if spacecraft_names is None:
+        spacecraft_names = get_state_store_index(path)["spacecraft_names"]
+    n_chunks = len(get_state_store_index(path)["chunks"])
+    if n_chunks != len(get_state_store_index(reference_path)["chunks"]):
+        raise ValueError("The stores must have the same chunks")
+
+    count = 0
+    max_differences = np.zeros((len(spacecraft_names), 2))
+    squared_differences = np.zeros((len(spacecraft_names), 2))
+    for chunk in range(n_chunks):
+        epochs, states, _ = read_state_store(path, spacecraft_names, chunks=[chunk])
+        reference_epochs, reference_states, _ = read_state_store(
+            reference_path, spacecraft_names, chunks=[chunk]
+        )
+        if not np.array_equal(epochs, reference_epochs):
+            raise ValueError(f"The epochs of chunk {chunk} differ between the stores")
+        # The first epoch of a chunk is the last epoch of the previous one
+        first = 1 if chunk > 0 else 0
+        differences = states[first:] - reference_states[first:]
+        norms = np.stack(
+            (
+                np.linalg.norm(differences[..., :3], axis=2),
+                np.linalg.norm(differences[..., 3:], axis=2),
+            ),
+            axis=2,
+        )
+        count += len(differences)
+        max_differences = np.maximum(max_differences, norms.max(axis=0, initial=0))
+        squared_differences += np.sum(norms**2, axis=0)
+
+    rms_differences = np.sqrt(squared_differences / max(count, 1))
+    return pd.DataFrame(
+        {
+            "max_position": max_differences[:, 0],
+            "rms_position": rms_differences[:, 0],
+            "max_velocity": max_differences[:, 1],
+            "rms_velocity": rms_differences[:, 1],
+        },
+        index=pd.Index(spacecraft_names, name="spacecraft"),
+    )
+
+
+class LazySpacecraftResults:
+    """
+    Results of one spacecraft, behaving like a data frame whose state columns are only read from the state store
+    when they are first accessed.
+
+    Columns are accessed and added as in a data frame, e.g. results["x"], results[["x", "y", "z"]].to_numpy() or
+    results["doppler_shift"] = ..., and to_dataframe() materializes all of them.
+    """
+
+    def __init__(self, load_states, length):
+        """
+        Parameters
+        ----------
+        load_states : callable
+            Function without arguments returning the states of the spacecraft as an array of shape (n, 6), possibly
+            memory-mapped
+        length : int
+            Number of epochs n
+        """
+        self._load_states = load_states
+        self._states = None
+        self._columns = {}
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __contains__(self, column):
+        return column in self.columns
+
+    @property
+    def columns(self):
+        return STATE_COLUMNS + [
+            column for column in self._columns if column not in STATE_COLUMNS
+        ]
+
+    def __getitem__(self, column):
+        if not isinstance(column, str):
+            return pd.DataFrame({name: self[name] for name in column})
+        if column not in self._columns:
+            if column not in STATE_COLUMNS:
+                raise KeyError(column)
+            if self._states is None:
+                self._states = self._load_states()
+            self._columns[column] = pd.Series(
+                self._states[:, STATE_COLUMNS.index(column)], name=column
+            )
+        return self._columns[column]
+
+    def __setitem__(self, column, values):
+        if np.ndim(values) == 0:
+            values = np.full(self.length, values)
+        self._columns[column] = pd.Series(values, name=column)
+
+    def to_dataframe(self):
+        """
+        Returns
+        -------
+        results : pd.DataFrame
+            All the columns of the spacecraft, in a data frame
+        """
+        return self[self.columns]
+
+
+def get_lazy_results_dict(path, chunk=None, start_epoch=None, end_epoch=None):
+    """
+    Get the results of a state store as a dictionary, without reading the states of the spacecraft until they are
+    accessed.
+
+    With a chunk, the states are memory-mapped views of the chunk files. Without a chunk, the states of a spacecraft
+    are read for the requested time range when one of its columns is first accessed.
+
+    Parameters
+    ----------
+    path : str
+        Path to the folder of the store
+    chunk : int, optional
+        Index of the chunk to read, by default the whole time range
+    start_epoch : float, optional
+        First epoch to read in seconds since J2000 when no chunk is given, by default the first epoch of the store
+    end_epoch : float, optional
+        Last epoch to read in seconds since J2000 when no chunk is given, by default the last epoch of the store
+
+    Returns
+    -------
+    results_dict : dict
+        'epochs' as a pd.Series, 'sun_direction' as a pd.DataFrame and a LazySpacecraftResults for each spacecraft
+    """
+    index = get_state_store_index(path)
+    if chunk is not None:
+        chunk_path = os_path.join(path, index["chunks"][chunk]["name"])
+        epochs = np.load(f"{chunk_path}_epochs.npy")
+        sun_directions = np.load(f"{chunk_path}_sun_direction.npy", mmap_mode="r")
+
+        def get_loader(sat_index):
+            return lambda: np.load(f"{chunk_path}_states.npy", mmap_mode="r")[sat_index]
+
+    else:
+        epochs, _, sun_directions = read_state_store(path, [], start_epoch, end_epoch)
+
+        def get_loader(sat_index):
+            return lambda: read_state_store(
+                path,
+                [index["spacecraft_names"][sat_index]],
+                start_epoch,
+                end_epoch,
+            )[1][:, 0]
+
+    results_dict = {
+        "epochs": pd.Series(epochs),
+        "sun_direction": pd.DataFrame(sun_directions),
+    }
+    for i, sat in enumerate(index["spacecraft_names"]):
+        results_dict[sat] = LazySpacecraftResults(get_loader(i), len(epochs))
+    return results_dict
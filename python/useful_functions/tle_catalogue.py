@@ -0,0 +1,345 @@
+from glob import glob
+from os import makedirs, path as os_path
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from astropy.time import Time
+from requests import get
+from sgp4.api import Satrec, SatrecArray
+
+from useful_functions.date_transformations import (
+    astrotime_to_epoch,
+    epoch_to_astrotime,
+    epoch_to_datetime64,
+)
+from useful_functions.frame_transformations import (
+    compute_teme_to_j2000_rotations,
+    teme_to_j2000,
+)
+
+tle_cache_path = str(Path(__file__).parents[1].joinpath("input_data", "tles"))
+CELESTRAK_URL = "https://celestrak.org/NORAD/elements/gp.php?GROUP={group}&FORMAT=tle"
+CONSTELLATION_GROUPS = {
+    "GPS": "gps-ops",
+    "Galileo": "galileo",
+    "Glonass": "glo-ops",
+    "Iridium": "iridium-NEXT",
+}
+
+
+def download_tles(group):
+    """
+    Download the TLEs of a group of satellites from celestrak.
+
+    Parameters
+    ----------
+    group : str
+        Celestrak group, e.g. "gps-ops"
+
+    Returns
+    -------
+    tles_text : str
+        TLEs in the three-line format (name, line 1, line 2)
+    """
+    return get(CELESTRAK_URL.format(group=group)).text
+
+
+def parse_tles(tles_text):
+    """
+    Parse TLEs in the three-line format.
+
+    Parameters
+    ----------
+    tles_text : str
+        TLEs, each satellite being described by its name, line 1 and line 2
+
+    Returns
+    -------
+    tles : pd.DataFrame
+        Data frame with the columns 'name', 'line1' and 'line2'
+    """
+    lines = [line.rstrip() for line in tles_text.splitlines() if line.strip()]
+    if len(lines) % 3 != 0:
+        raise ValueError("The TLEs must have three lines per satellite")
+    return pd.DataFrame(
+        {
+            "name": [line.strip() for line in lines[0::3]],
+            "line1": lines[1::3],
+            "line2": lines[2::3],
+        }
+    )
+
+
+def get_directory_source(path):
+    """
+    Get a stand-in for download_tles reading the TLEs from a folder instead of celestrak, for instance to test the
+    cache offline.
+
+    Parameters
+    ----------
+    path : str
+        Path to a folder with one '{group}.txt' file of TLEs per group
+
+    Returns
+    -------
+    source : callable
+        Function of a celestrak group returning the TLEs as text, like download_tles
+    """
+
+    def read_tles(group):
+        with open(os_path.join(path, f"{group}.txt"), "r", encoding="utf_8_sig") as f:
+            return f.read()
+
+    return read_tles
+
+
+def refresh_tles(group, source=download_tles, cache_path=tle_cache_path):
+    """
+    Fetch the TLEs of a group and save them in the cache, as '{cache_path}/{group}/{UTC date of today}.txt'.
+
+    Parameters
+    ----------
+    group : str
+        Celestrak group, e.g. "gps-ops"
+    source : callable, optional
+        Function of the group returning the TLEs as text, by default download_tles
+    cache_path : str, optional
+        Path to the folder of the cache, by default input_data/tles
+
+    Returns
+    -------
+    tles_text : str
+        TLEs in the three-line format
+    """
+    tles_text = source(group)
+    parse_tles(tles_text)
+    makedirs(os_path.join(cache_path, group), exist_ok=True)
+    today = np.datetime64("now", "D")
+    with open(os_path.join(cache_path, group, f"{today}.txt"), "w", newline="") as f:
+        f.write(tles_text)
+    return tles_text
+
+
+def get_cached_dates(group, cache_path=tle_cache_path):
+    """
+    Get the dates at which the TLEs of a group were saved in the cache.
+
+    Parameters
+    ----------
+    group : str
+        Celestrak group, e.g. "gps-ops"
+    cache_path : str, optional
+        Path to the folder of the cache, by default input_data/tles
+
+    Returns
+    -------
+    dates : np.ndarray
+        Sorted dates, as datetime64[D]
+    """
+    filenames = glob(os_path.join(cache_path, group, "*.txt"))
+    dates = [Path(filename).stem for filename in filenames]
+    return np.sort(np.array(dates, dtype="datetime64[D]"))
+
+
+def get_cached_tles(group, epoch=None, cache_path=tle_cache_path):
+    """
+    Get the TLEs of a group from the cache: the latest ones saved on or before the date of an epoch.
+
+    Parameters
+    ----------
+    group : str
+        Celestrak group, e.g. "gps-ops"
+    epoch : float, optional
+        Epoch in seconds since J2000, by default the latest TLEs of the cache
+    cache_path : str, optional
+        Path to the folder of the cache, by default input_data/tles
+
+    Returns
+    -------
+    tles_text : str
+        TLEs in the three-line format
+    """
+    dates = get_cached_dates(group, cache_path)
+    if epoch is not None:
+        date = epoch_to_datetime64(epoch, unit="s").astype("datetime64[D]")
+        dates = dates[dates <= date]
+    if len(dates) == 0:
+        raise ValueError(f"No cached TLEs for {group} on or before the date of the epoch")
+    with open(
+        os_path.join(cache_path, group, f"{dates[-1]}.txt"), "r", encoding="utf_8_sig"
+    ) as f:
+        return f.read()
+
+
+def get_catalogue(
+    constellations,
+    epoch=None,
+    refresh=False,
+    source=download_tles,
+    cache_path=tle_cache_path,
+):
+    """
+    Get the TLEs of several constellations in a single catalogue, from the cache. TLEs are only downloaded if refresh
+    is True or if the cache has no TLEs of a constellation yet.
+
+    Parameters
+    ----------
+    constellations : list of str
+        Names of the constellations, keys of CONSTELLATION_GROUPS, e.g. ["GPS", "Galileo"]
+    epoch : float, optional
+        Epoch in seconds since J2000, to use the latest TLEs cached on or before its date, by default the latest TLEs
+        of the cache
+    refresh : bool, optional
+        Fetch new TLEs from the source and add them to the cache, by default False
+    source : callable, optional
+        Function of a celestrak group returning the TLEs as text, by default download_tles, see get_directory_source
+    cache_path : str, optional
+        Path to the folder of the cache, by default input_data/tles
+
+    Returns
+    -------
+    catalogue : pd.DataFrame
+        Data frame with the columns 'constellation', 'name', 'line1' and 'line2'
+    """
+    catalogue = []
+    for constellation in constellations:
+        if constellation not in CONSTELLATION_GROUPS:
+            raise ValueError(
+                f"constellation must be one of {list(CONSTELLATION_GROUPS)}"
+            )
+        group = CONSTELLATION_GROUPS[constellation]
+        if refresh or len(get_cached_dates(group, cache_path)) == 0:
+            tles_text = refresh_tles(group, source, cache_path)
+        else:
+            tles_text = get_cached_tles(group, epoch, cache_path)
+        tles = parse_tles(tles_text)
+        tles.insert(0, "constellation", constellation)
+        catalogue.append(tles)
+    return pd.concat(catalogue, ignore_index=True)
+
+
+def get_satrecs(catalogue):
+    """
+    Initialize the SGP4 satellite records of the TLEs of a catalogue.
+
+    Parameters
+    ----------
+    catalogue : pd.DataFrame
+        TLEs, with the columns 'line1' and 'line2'
+
+    Returns
+    -------
+    satrecs : list of sgp4.api.Satrec
+    """
+    return [
+        Satrec.twoline2rv(line1, line2)
+        for line1, line2 in zip(catalogue["line1"], catalogue["line2"])
+    ]
+
+
+def get_sync_epoch(satrecs):
+    """
+    Get the first midnight (UTC) after the latest epoch of the TLEs, at which the satellites are synced.
+
+    Parameters
+    ----------
+    satrecs : list of sgp4.api.Satrec
+        SGP4 satellite records, as returned by get_satrecs
+
+    Returns
+    -------
+    sync_epoch : float
+        Epoch in seconds since J2000
+    """
+    latest_jd = max(satrec.jdsatepoch + satrec.jdsatepochF for satrec in satrecs)
+    sync_jd = np.ceil(latest_jd - 0.5) + 0.5
+    return float(astrotime_to_epoch(Time(sync_jd, format="jd", scale="utc")))
+
+
+def compute_teme_states(satrecs, epochs):
+    """
+    Compute the states of all the satellites at all the epochs with SGP4, in one vectorized call of a SatrecArray.
+
+    Parameters
+    ----------
+    satrecs : list of sgp4.api.Satrec
+        SGP4 satellite records of s satellites, as returned by get_satrecs
+    epochs : np.ndarray
+        t epochs in seconds since J2000
+
+    Returns
+    -------
+    teme_states : np.ndarray of shape (s, t, 6)
+        Positions and velocities in TEME frame in m and m/s
+    """
+    epochs = np.atleast_1d(np.asarray(epochs, dtype=np.float64))
+    astrotime = epoch_to_astrotime(epochs)
+    errors, teme_r, teme_v = SatrecArray(satrecs).sgp4(
+        astrotime.utc.jd1, astrotime.utc.jd2
+    )
+    if np.any(errors):
+        failed = np.flatnonzero(np.any(errors, axis=1))
+        raise ValueError(f"SGP4 failed for the satellites at indices {failed}")
+    return np.concatenate((teme_r, teme_v), axis=2) * 1e3
+
+
+def sync_catalogue(catalogue, sync_epoch=None):
+    """
+    Sync the satellites of a catalogue, possibly of several constellations, at a common epoch.
+
+    Parameters
+    ----------
+    catalogue : pd.DataFrame
+        TLEs, as returned by get_catalogue
+    sync_epoch : float, optional
+        Epoch in seconds since J2000, by default the first midnight after the latest epoch of the TLEs
+
+    Returns
+    -------
+    states_synced : pd.DataFrame
+        Data frame with the columns 'constellation' (if in the catalogue), 'name', 'x', 'y', 'z', 'vx', 'vy', 'vz'
+        (J2000 state in m and m/s) and 'epoch'
+    """
+    satrecs = get_satrecs(catalogue)
+    if sync_epoch is None:
+        sync_epoch = get_sync_epoch(satrecs)
+    teme_states = compute_teme_states(satrecs, sync_epoch)[:, 0]
+    states_synced = pd.DataFrame(
+        teme_to_j2000(teme_states, sync_epoch),
+        columns=["x", "y", "z", "vx", "vy", "vz"],
+    )
+    states_synced.insert(0, "name", catalogue["name"].to_numpy())
+    if "constellation" in catalogue:
+        states_synced.insert(0, "constellation", catalogue["constellation"].to_numpy())
+    states_synced["epoch"] = sync_epoch
+    return states_synced
+
+
+def propagate_catalogue(catalogue, epochs):
+    """
+    Compute the J2000 states of the satellites of a catalogue over a time grid with SGP4.
+
+    The TEME to J2000 rotation is interpolated between hourly matrices, see compute_teme_to_j2000_rotations.
+
+    Parameters
+    ----------
+    catalogue : pd.DataFrame
+        TLEs of s satellites, as returned by get_catalogue
+    epochs : np.ndarray
+        t epochs in seconds since J2000
+
+    Returns
+    -------
+    states : np.ndarray of shape (s, t, 6)
+        Positions and velocities in J2000 frame in m and m/s
+    """
+    teme_states = compute_teme_states(get_satrecs(catalogue), epochs)
+    rotations = compute_teme_to_j2000_rotations(epochs)
+    return np.concatenate(
+        (
+            np.einsum("tij,stj->sti", rotations, teme_states[..., :3]),
+            np.einsum("tij,stj->sti", rotations, teme_states[..., 3:]),
+        ),
+        axis=2,
+    )
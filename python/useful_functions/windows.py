@@ -0,0 +1,434 @@
+import numpy as np
+import pandas as pd
+
+from useful_functions.date_transformations import epoch_to_datetime
+
+
+def get_window_indices(boolean_vector):
+    """
+    Get the first and last indices of each streak of True values in a boolean vector.
+
+    Parameters
+    ----------
+    boolean_vector : np.ndarray
+        Array of booleans, for instance the visibility or the eclipse state at each epoch
+
+    Returns
+    -------
+    start_indices : np.ndarray
+        Index of the first True value of each streak
+    end_indices : np.ndarray
+        Index of the last True value of each streak
+    """
+    padded_vector = np.concatenate(([False], np.asarray(boolean_vector, dtype=bool), [False]))
+    changes = np.diff(padded_vector.astype(np.int8))
+    start_indices = np.flatnonzero(changes == 1)
+    end_indices = np.flatnonzero(changes == -1) - 1
+    return start_indices, end_indices
+
+
+def get_windows_dataframe(boolean_vector, epochs) -> pd.DataFrame:
+    """
+    Organise the streaks of True values of a boolean vector into a data frame of windows.
+
+    Parameters
+    ----------
+    boolean_vector : np.ndarray
+        Array of booleans, for instance the visibility or the eclipse state at each epoch
+    epochs : np.ndarray
+        Array of epochs in seconds since J2000
+
+    Returns
+    -------
+    windows_df: pd.DataFrame
+        Returns a data frame containing the following information about the windows
+         - 'start' : start date of the window
+         - 'end' : end date of the window
+         - 'start_epoch' : start epoch of the window
+         - 'end_epoch' : end epoch of the window
+         - 'duration' : duration of the window
+         - 'partial' : True if the window is cut by the first or last epoch, False if not
+    """
+    epochs = np.asarray(epochs)
+    start_indices, end_indices = get_window_indices(boolean_vector)
+    return build_windows_dataframe(
+        epochs[start_indices],
+        epochs[end_indices],
+        (start_indices == 0) | (end_indices == len(epochs) - 1),
+    )
+
+
+def build_windows_dataframe(start_epochs, end_epochs, partial) -> pd.DataFrame:
+    """
+    Organise the start and end epochs of windows into a data frame.
+
+    Parameters
+    ----------
+    start_epochs : np.ndarray
+        Start epochs of the windows in seconds since J2000
+    end_epochs : np.ndarray
+        End epochs of the windows in seconds since J2000
+    partial : np.ndarray
+        True for the windows cut by the first or last epoch
+
+    Returns
+    -------
+    windows_df: pd.DataFrame
+        Data frame with the columns of get_windows_dataframe
+    """
+    start_epochs = np.asarray(start_epochs, dtype=np.float64)
+    end_epochs = np.asarray(end_epochs, dtype=np.float64)
+    windows_df = pd.DataFrame(
+        {
+            "start_epoch": start_epochs,
+            "end_epoch": end_epochs,
+            "duration": end_epochs - start_epochs,
+            "partial": np.asarray(partial, dtype=bool),
+        }
+    )
+    windows_df["start"] = epoch_to_datetime(windows_df["start_epoch"])
+    windows_df["end"] = epoch_to_datetime(windows_df["end_epoch"])
+
+    windows_df = windows_df[
+        ["start", "end", "start_epoch", "end_epoch", "duration", "partial"]
+    ]
+    return windows_df
+
+
+def compute_adaptive_mask(evaluate_mask, shape, coarse_step):
+    """
+    Compute a boolean mask of shape (t, s), for instance the visibility of s satellites at t epochs, by evaluating it
+    every coarse_step samples and only refining the intervals where it changes between two coarse samples.
+
+    Each column is refined independently: in an interval where a column changes, the mask of this column is evaluated
+    at every sample, elsewhere it takes the value of the previous coarse sample. The result is the same as a full
+    evaluation as long as a column does not change twice within coarse_step samples.
+
+    Parameters
+    ----------
+    evaluate_mask : callable
+        Function of two integer arrays of the same length, sample indices and column indices, returning the mask at
+        each of these (sample, column) pairs
+    shape : tuple of int
+        Number of samples t and of columns s of the mask
+    coarse_step : int
+        Number of samples between two coarse evaluations
+
+    Returns
+    -------
+    mask : np.ndarray of shape (t, s)
+        Array of booleans
+    """
+    length, n_columns = shape
+    if coarse_step < 1:
+        raise ValueError("coarse_step must be a positive number of samples")
+    if length == 0:
+        return np.zeros(shape, dtype=bool)
+    coarse_indices = np.unique(np.append(np.arange(0, length, coarse_step), length - 1))
+    time_indices, column_indices = np.meshgrid(
+        coarse_indices, np.arange(n_columns), indexing="ij"
+    )
+    coarse_mask = np.asarray(
+        evaluate_mask(time_indices.ravel(), column_indices.ravel()), dtype=bool
+    ).reshape(len(coarse_indices), n_columns)
+
+    # Samples between two coarse samples take the value of the previous coarse sample
+    mask = np.repeat(coarse_mask, np.diff(coarse_indices, append=length), axis=0)
+
+    # Evaluate every sample of the intervals where a column changes
+    interval_indices, column_indices = np.nonzero(coarse_mask[1:] != coarse_mask[:-1])
+    counts = np.diff(coarse_indices)[interval_indices] - 1
+    if counts.sum() > 0:
+        first_offsets = np.repeat(np.cumsum(counts) - counts, counts)
+        offsets = np.arange(counts.sum()) - first_offsets
+        time_indices = np.repeat(coarse_indices[interval_indices] + 1, counts) + offsets
+        column_indices = np.repeat(column_indices, counts)
+        mask[time_indices, column_indices] = evaluate_mask(time_indices, column_indices)
+    return mask
+
+
+class WindowAccumulator:
+    """
+    Stitch the windows of consecutive chunks (for instance propagation days) into the windows of the whole mission.
+
+    A window reaching the end of a chunk is kept open and merged with the window starting at the beginning of the
+    next chunk, if any. Only the windows cut by the first epoch of the first chunk or by the last epoch of the last
+    chunk are flagged as partial. At most one window is kept in memory between chunks.
+
+    Chunks are given in chronological order, either as boolean vectors with add_chunk or as start and end epochs
+    of windows with add_windows. finish() returns the window still open at the end of the mission.
+    """
+
+    def __init__(self):
+        self.mission_start_epoch = None
+        self.open_start_epoch = None
+        self.open_end_epoch = None
+
+    def add_chunk(self, boolean_vector, epochs) -> pd.DataFrame:
+        """
+        Add the boolean vector of a chunk, for instance the visibility or the eclipse state at each epoch.
+
+        Parameters
+        ----------
+        boolean_vector : np.ndarray
+            Array of booleans of the chunk
+        epochs : np.ndarray
+            Array of epochs of the chunk in seconds since J2000
+
+        Returns
+        -------
+        windows_df: pd.DataFrame
+            Windows closed in this chunk, with the columns of get_windows_dataframe
+        """
+        epochs = np.asarray(epochs)
+        start_indices, end_indices = get_window_indices(boolean_vector)
+        return self.add_windows(
+            epochs[start_indices], epochs[end_indices], epochs[0], epochs[-1]
+        )
+
+    def add_windows(
+        self, start_epochs, end_epochs, chunk_start_epoch, chunk_end_epoch
+    ) -> pd.DataFrame:
+        """
+        Add the windows of a chunk, for instance the refined eclipses returned by compute_eclipse_events.
+
+        Parameters
+        ----------
+        start_epochs : np.ndarray
+            Start epochs of the windows of the chunk in seconds since J2000
+        end_epochs : np.ndarray
+            End epochs of the windows of the chunk in seconds since J2000
+        chunk_start_epoch : float
+            First epoch of the chunk
+        chunk_end_epoch : float
+            Last epoch of the chunk
+
+        Returns
+        -------
+        windows_df: pd.DataFrame
+            Windows closed in this chunk, with the columns of get_windows_dataframe
+        """
+        start_epochs = list(np.asarray(start_epochs, dtype=np.float64))
+        end_epochs = list(np.asarray(end_epochs, dtype=np.float64))
+        if self.mission_start_epoch is None:
+            self.mission_start_epoch = chunk_start_epoch
+
+        # Merge the open window with the first window of the chunk, or close it
+        closed_start_epochs, closed_end_epochs = [], []
+        if self.open_start_epoch is not None:
+            if start_epochs and start_epochs[0] <= chunk_start_epoch:
+                start_epochs[0] = self.open_start_epoch
+            else:
+                closed_start_epochs.append(self.open_start_epoch)
+                closed_end_epochs.append(self.open_end_epoch)
+            self.open_start_epoch = None
+            self.open_end_epoch = None
+
+        # Keep the last window of the chunk open if it reaches the end of the chunk
+        if end_epochs and end_epochs[-1] >= chunk_end_epoch:
+            self.open_start_epoch = start_epochs.pop()
+            self.open_end_epoch = end_epochs.pop()
+
+        closed_start_epochs = np.array(closed_start_epochs + start_epochs)
+        closed_end_epochs = np.array(closed_end_epochs + end_epochs)
+        return build_windows_dataframe(
+            closed_start_epochs,
+            closed_end_epochs,
+            closed_start_epochs == self.mission_start_epoch,
+        )
+
+    def finish(self) -> pd.DataFrame:
+        """
+        Close the window still open at the end of the mission, if any.
+
+        Returns
+        -------
+        windows_df: pd.DataFrame
+            The open window, flagged as partial, with the columns of get_windows_dataframe
+        """
+        if self.open_start_epoch is None:
+            return build_windows_dataframe([], [], [])
+        windows_df = build_windows_dataframe(
+            [self.open_start_epoch], [self.open_end_epoch], [True]
+        )
+        self.open_start_epoch = None
+        self.open_end_epoch = None
+        return windows_df
+
+
+class NetworkWindowAccumulator:
+    """
+    Stitch the windows of consecutive chunks for each column of a (t, n) boolean matrix, for instance the visibility
+    of the spacecraft from n ground stations, like a WindowAccumulator per column but in vectorized operations.
+    """
+
+    def __init__(self, names):
+        """
+        Parameters
+        ----------
+        names : list of str
+            Names of the columns, written in the 'station' column of the windows
+        """
+        self.names = np.asarray(names)
+        self.mission_start_epoch = None
+        self.open_start_epochs = np.full(len(self.names), np.nan)
+        self.open_end_epochs = np.full(len(self.names), np.nan)
+
+    def add_chunk(self, boolean_matrix, epochs) -> pd.DataFrame:
+        """
+        Add the boolean matrix of a chunk.
+
+        Parameters
+        ----------
+        boolean_matrix : np.ndarray of shape (t, n)
+            Array of booleans of the chunk
+        epochs : np.ndarray
+            Array of epochs of the chunk in seconds since J2000
+
+        Returns
+        -------
+        windows_df: pd.DataFrame
+            Windows closed in this chunk, with a 'station' column and the columns of get_windows_dataframe, sorted by
+            column then start epoch
+        """
+        epochs = np.asarray(epochs)
+        if self.mission_start_epoch is None:
+            self.mission_start_epoch = epochs[0]
+        boolean_matrix = np.asarray(boolean_matrix, dtype=bool)
+        padding = np.zeros((1, boolean_matrix.shape[1]), dtype=np.int8)
+        changes = np.diff(
+            np.concatenate((padding, boolean_matrix.view(np.int8), padding)), axis=0
+        ).T
+        # Windows sorted by column then time
+        columns, start_indices = np.nonzero(changes == 1)
+        end_indices = np.nonzero(changes == -1)[1] - 1
+        start_epochs = epochs[start_indices]
+        end_epochs = epochs[end_indices]
+
+        # Merge the open windows with the first window of their column, or close them
+        is_open = ~np.isnan(self.open_start_epochs)
+        merged = (start_indices == 0) & is_open[columns]
+        start_epochs[merged] = self.open_start_epochs[columns[merged]]
+        is_open[columns[merged]] = False
+        closed_columns = np.flatnonzero(is_open)
+        columns = np.concatenate((closed_columns, columns))
+        start_epochs = np.concatenate(
+            (self.open_start_epochs[closed_columns], start_epochs)
+        )
+        end_epochs = np.concatenate((self.open_end_epochs[closed_columns], end_epochs))
+        self.open_start_epochs[:] = np.nan
+        self.open_end_epochs[:] = np.nan
+
+        # Keep the windows reaching the end of the chunk open
+        reaching_end = end_epochs >= epochs[-1]
+        self.open_start_epochs[columns[reaching_end]] = start_epochs[reaching_end]
+        self.open_end_epochs[columns[reaching_end]] = end_epochs[reaching_end]
+        order = np.lexsort((start_epochs, columns))
+        order = order[~reaching_end[order]]
+        return self._build_windows_dataframe(
+            columns[order],
+            start_epochs[order],
+            end_epochs[order],
+            start_epochs[order] == self.mission_start_epoch,
+        )
+
+    def finish(self) -> pd.DataFrame:
+        """
+        Close the windows still open at the end of the mission.
+
+        Returns
+        -------
+        windows_df: pd.DataFrame
+            The open windows, flagged as partial, with the columns of add_chunk
+        """
+        columns = np.flatnonzero(~np.isnan(self.open_start_epochs))
+        windows_df = self._build_windows_dataframe(
+            columns,
+            self.open_start_epochs[columns],
+            self.open_end_epochs[columns],
+            np.ones(len(columns), dtype=bool),
+        )
+        self.open_start_epochs[:] = np.nan
+        self.open_end_epochs[:] = np.nan
+        return windows_df
+
+    def _build_windows_dataframe(self, columns, start_epochs, end_epochs, partial):
+        windows_df = build_windows_dataframe(start_epochs, end_epochs, partial)
+        windows_df.insert(0, "station", self.names[columns])
+        return windows_df
+
+
+class WindowStatistics:
+    """
+    Statistics of windows updated chunk by chunk, without keeping the windows in memory: number of windows, minimum,
+    maximum and mean duration, passes per day and visibility per day. Windows of null duration are ignored.
+
+    Passes and visibility per day are averaged over the time between the start of the first window and the start of
+    the last one.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total_duration = 0.0
+        self.min_duration = np.nan
+        self.max_duration = np.nan
+        self.first_start_epoch = np.nan
+        self.last_start_epoch = np.nan
+
+    def add(self, windows_df):
+        """
+        Update the statistics with new windows
+
+        Parameters
+        ----------
+        windows_df : pd.DataFrame
+            Windows in chronological order, with the columns of get_windows_dataframe
+        """
+        windows_df = windows_df[windows_df["duration"] > 0]
+        if windows_df.empty:
+            return
+        durations = windows_df["duration"].to_numpy()
+        self.count += len(durations)
+        self.total_duration += durations.sum()
+        self.min_duration = np.fmin(self.min_duration, durations.min())
+        self.max_duration = np.fmax(self.max_duration, durations.max())
+        self.first_start_epoch = np.fmin(
+            self.first_start_epoch, windows_df["start_epoch"].iloc[0]
+        )
+        self.last_start_epoch = np.fmax(
+            self.last_start_epoch, windows_df["start_epoch"].iloc[-1]
+        )
+
+    @property
+    def mean_duration(self):
+        return self.total_duration / self.count if self.count else np.nan
+
+    @property
+    def days(self):
+        return (self.last_start_epoch - self.first_start_epoch) / 86400
+
+    @property
+    def passes_per_day(self):
+        return self.count / self.days if self.days > 0 else np.nan
+
+    @property
+    def visibility_per_day(self):
+        return self.total_duration / self.days if self.days > 0 else np.nan
+
+    def print_summary(self, name):
+        """
+        Print the statistics
+
+        Parameters
+        ----------
+        name : str
+            Name of the windows in the messages, e.g. "gps"
+        """
+        print(f"Minimum {name} window duration: {self.min_duration} seconds")
+        print(f"Maximum {name} window duration: {self.max_duration} seconds")
+        print(f"Average {name} window duration: {self.mean_duration} seconds")
+        print(f"Average {name} passes per day: {self.passes_per_day:.2f} passes")
+        print(
+            f"Average {name} visibility per day: "
+            f"{self.visibility_per_day:.2f} seconds"
+        )
@@ -1,10 +1,23 @@
-from useful_functions.date_transformations import epoch_to_astrotime, astrotime_to_epoch
+from useful_functions.date_transformations import (
+    J2000,
+    epoch_to_astrotime,
+    epoch_to_datetime64,
+    datetime64_to_epoch,
+)
 from astropy.time import Time
+import numpy as np
 import pandas as pd
 from attitude import nadir_pointing, sun_pointing_rotation
 
 cic_reference_jd = 2400000.5
 cic_reference_time = Time(cic_reference_jd, format="jd", scale="tai")
+cic_reference_datetime64 = np.datetime64("1858-11-17T00:00:00", "ns")
+
+# Days and seconds of J2000 since the CIC reference time, in the TAI scale
+cic_j2000_days, cic_j2000_seconds = divmod((J2000 - cic_reference_time).sec, 86400)
+
+# Number of lines formatted and written at once by the streaming writers
+cic_chunk_size = 100000
 
 
 def generate_oem_dataframe(days, seconds, states):
@@ -59,7 +72,7 @@ def generate_aem_dataframe(days, seconds, quaternions):
     return aem_dataframe
 
 
-def epochs_to_CIC_days_secs(epochs):
+def epochs_to_CIC_days_secs(epochs, time_scale="TAI"):
     """
     Convert epochs in seconds since J2000 to days and seconds since CIC reference time
 
@@ -67,27 +80,40 @@ def epochs_to_CIC_days_secs(epochs):
     ----------
     epochs : list of float or np.ndarray of shape (n,)
         Epochs in seconds since J2000
+    time_scale : str, optional
+        Time scale of the days and seconds, "TAI" (as in the CIC files) or "UTC" (as in the VTS project files),
+        by default "TAI"
 
     Returns
     -------
-    days : list of int of length n
+    days : np.ndarray of int of shape (n,)
         Days since CIC reference time
-    seconds : list of float of length n
-        Seconds in the day
+    seconds : np.ndarray of float of shape (n,)
+        Seconds in the day, rounded to the millisecond (half-millisecond ties are rounded to even)
 
     """
-    astrotimes = epoch_to_astrotime(epochs)
-    timedeltas_since_cic = [astrotime - cic_reference_time for astrotime in astrotimes]
-    julian_days_since_cic = [timedelta.jd for timedelta in timedeltas_since_cic]
-    days = [int(julian_day) for julian_day in julian_days_since_cic]
-    seconds = [
-        round((julian_day.jd - int(julian_day.jd)) * 86400, 3)
-        for julian_day in timedeltas_since_cic
-    ]
+    epochs = np.asarray(epochs, dtype=np.float64)
+    if time_scale == "TAI":
+        # TAI has no leap seconds, so the epochs are only shifted by the (constant) TAI time of J2000
+        elapsed_days = np.floor((cic_j2000_seconds + epochs) / 86400)
+        days = cic_j2000_days + elapsed_days
+        seconds = cic_j2000_seconds + epochs - elapsed_days * 86400
+    elif time_scale == "UTC":
+        elapsed = epoch_to_datetime64(epochs) - cic_reference_datetime64
+        days = elapsed // np.timedelta64(1, "D")
+        seconds = (elapsed - days * np.timedelta64(1, "D")) / np.timedelta64(1, "s")
+    else:
+        raise ValueError("time_scale must be TAI or UTC")
+    seconds = np.round(seconds, 3)
+
+    # Rounding can reach the end of the day
+    end_of_day = seconds >= 86400
+    days = days.astype(np.int64) + end_of_day
+    seconds = seconds - end_of_day * 86400
     return days, seconds
 
 
-def CIC_days_secs_to_epochs(days, seconds):
+def CIC_days_secs_to_epochs(days, seconds, time_scale="TAI"):
     """
     Convert days and seconds since CIC reference time to epochs in seconds since J2000
 
@@ -97,18 +123,24 @@ def CIC_days_secs_to_epochs(days, seconds):
         Days since CIC reference time
     seconds : list of float or np.ndarray of shape (n,)
         Seconds in the day
+    time_scale : str, optional
+        Time scale of the days and seconds, "TAI" (as in the CIC files) or "UTC" (as in the VTS project files),
+        by default "TAI"
 
     Returns
     -------
-    epochs : list of float of length n
+    epochs : np.ndarray of float of shape (n,)
         Epochs in seconds since J2000
     """
-    julian_days = [day + second / 86400 for day, second in zip(days, seconds)]
-    astrotimes = [
-        Time(julian_day, format="jd", scale="tai") for julian_day in julian_days
-    ]
-    epochs = [astrotime_to_epoch(astrotime) for astrotime in astrotimes]
-    return epochs
+    days = np.asarray(days, dtype=np.int64)
+    seconds = np.asarray(seconds, dtype=np.float64)
+    if time_scale == "TAI":
+        return (days - cic_j2000_days) * 86400 + (seconds - cic_j2000_seconds)
+    elif time_scale == "UTC":
+        midnights = cic_reference_datetime64 + days.astype("timedelta64[D]")
+        return datetime64_to_epoch(midnights) + seconds
+    else:
+        raise ValueError("time_scale must be TAI or UTC")
 
 
 def generate_cic_files(
@@ -137,12 +169,9 @@ def generate_cic_files(
     mute : bool, optional
         If True, the function will not print anything, by default False
     """
-    days, seconds = epochs_to_CIC_days_secs(epochs)
-    oem_dataframe = generate_oem_dataframe(days, seconds, satellite_states)
-    export_OEM_file(
-        oem_dataframe,
-        epochs[0],
-        epochs[-1],
+    write_OEM_file(
+        epochs,
+        satellite_states,
         path,
         spacecraft_name=spacecraft_name,
         mute=mute,
@@ -155,11 +184,9 @@ def generate_cic_files(
         quaternions = nadir_pointing.compute_attitude_quaternions(
             satellite_states[:, :3]
         )
-    aem_dataframe = generate_aem_dataframe(days, seconds, quaternions)
-    export_AEM_file(
-        aem_dataframe,
-        epochs[0],
-        epochs[-1],
+    write_AEM_file(
+        epochs,
+        quaternions,
         path,
         spacecraft_name=spacecraft_name,
         mute=mute,
@@ -279,7 +306,11 @@ def export_OEM_file(
     with open(f"{path}{spacecraft_name}_POSITION_VELOCITY.TXT", "w") as f:
         f.write("\n".join(get_OEM_header(start, end, spacecraft_name)))
         f.write(
-            "\n".join(oem_dataframe.to_string(header=False, index=False).split("\n"))
+            format_cic_lines(
+                oem_dataframe["days"],
+                oem_dataframe["seconds"],
+                oem_dataframe[["x", "y", "z", "vx", "vy", "vz"]].to_numpy(),
+            )
         )
     if not mute:
         print(f"OEM file exported to {path}{spacecraft_name}_POSITION_VELOCITY.TXT")
@@ -323,18 +354,344 @@ def export_AEM_file(
             )
         )
         f.write(
-            "\n".join(
-                aem_dataframe.to_string(
-                    header=False,
-                    index=False,
-                    formatters={
-                        "q0": lambda x: f"{x:.6f}",
-                        "q1": lambda x: f"{x:.6f}",
-                        "q2": lambda x: f"{x:.6f}",
-                        "q3": lambda x: f"{x:.6f}",
-                    },
-                ).split("\n")
+            format_cic_lines(
+                aem_dataframe["days"],
+                aem_dataframe["seconds"],
+                aem_dataframe[["q0", "q1", "q2", "q3"]].to_numpy(),
             )
         )
     if not mute:
         print(f"AEM file exported to {path}{spacecraft_name}_QUATERNION.TXT")
+
+
+def format_cic_lines(days, seconds, values, decimals=6):
+    """
+    Format the data lines of a CIC file, one line per epoch, with a single format string per line
+
+    Parameters
+    ----------
+    days : list of int or np.ndarray of shape (n,)
+        Days since CIC reference time
+    seconds : list of float or np.ndarray of shape (n,)
+        Seconds in the day
+    values : np.ndarray of shape (n, m)
+        Values to write after the date, for instance positions and velocities in km and km/s, or quaternions
+    decimals : int, optional
+        Number of decimals of the values, by default 6
+
+    Returns
+    -------
+    lines : str
+        Lines of the data block, each one ending with a line break
+    """
+    values = np.asarray(values, dtype=np.float64)
+    line_format = "%d %.3f" + f" %.{decimals}f" * values.shape[1] + "\n"
+    columns = [np.asarray(days, dtype=np.int64), np.asarray(seconds, dtype=np.float64)]
+    columns += list(values.T)
+    rows = zip(*[column.tolist() for column in columns])
+    return "".join(map(line_format.__mod__, rows))
+
+
+def write_cic_data(file, chunks, scale=1.0, chunk_size=cic_chunk_size):
+    """
+    Write the data block of a CIC file chunk by chunk, so that the memory usage does not depend on the number of epochs
+
+    Parameters
+    ----------
+    file : file object
+        File opened in text mode, positioned after the header
+    chunks : iterable of tuple of np.ndarray
+        Chunks of (epochs, values), with epochs in seconds since J2000 of shape (n,) and values of shape (n, m)
+    scale : float, optional
+        Factor applied to the values before writing them, by default 1.0
+    chunk_size : int, optional
+        Maximum number of lines formatted at once, by default cic_chunk_size
+    """
+    for epochs, values in chunks:
+        epochs = np.asarray(epochs, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        for start in range(0, len(epochs), chunk_size):
+            days, seconds = epochs_to_CIC_days_secs(epochs[start : start + chunk_size])
+            file.write(
+                format_cic_lines(
+                    days, seconds, values[start : start + chunk_size] * scale
+                )
+            )
+
+
+def stream_OEM_file(
+    chunks,
+    start_epoch,
+    end_epoch,
+    path,
+    spacecraft_name="TOLOSAT",
+    chunk_size=cic_chunk_size,
+    mute=False,
+):
+    """
+    Export cartesian states of the satellite to an OEM file following the CIC/CCSDS format, chunk by chunk.
+
+    Parameters
+    ----------
+    chunks : iterable of tuple of np.ndarray
+        Chunks of (epochs, states) in chronological order, with epochs in seconds since J2000 of shape (n,) and
+        states in the EME2000/J2000 frame in meters and meters per second of shape (n, 6). It can be a generator,
+        for instance one reading the results of a propagation day by day.
+    start_epoch : float
+        Start time of the data (in seconds since J2000)
+    end_epoch : float
+        End time of the data (in seconds since J2000)
+    path : str
+        Path to the folder where the file will be exported
+    spacecraft_name : str, optional
+        Name of the spacecraft, by default "TOLOSAT"
+    chunk_size : int, optional
+        Maximum number of lines formatted at once, by default cic_chunk_size
+    mute : bool, optional
+        If True, no print is made, by default False
+    """
+    start = epoch_to_astrotime(start_epoch)
+    end = epoch_to_astrotime(end_epoch)
+    with open(f"{path}{spacecraft_name}_POSITION_VELOCITY.TXT", "w") as f:
+        f.write("\n".join(get_OEM_header(start, end, spacecraft_name)))
+        write_cic_data(f, chunks, scale=1e-3, chunk_size=chunk_size)
+    if not mute:
+        print(f"OEM file exported to {path}{spacecraft_name}_POSITION_VELOCITY.TXT")
+
+
+def stream_AEM_file(
+    chunks,
+    start_epoch,
+    end_epoch,
+    path,
+    spacecraft_name="TOLOSAT",
+    chunk_size=cic_chunk_size,
+    mute=False,
+):
+    """
+    Export attitude quaternions of the satellite to an AEM file following the CIC/CCSDS format, chunk by chunk.
+
+    Parameters
+    ----------
+    chunks : iterable of tuple of np.ndarray
+        Chunks of (epochs, quaternions) in chronological order, with epochs in seconds since J2000 of shape (n,) and
+        quaternions with respect to the EME2000/J2000 frame of shape (n, 4)
+    start_epoch : float
+        Start time of the data (in seconds since J2000)
+    end_epoch : float
+        End time of the data (in seconds since J2000)
+    path : str
+        Path to the folder where the file will be exported
+    spacecraft_name : str, optional
+        Name of the spacecraft, by default "TOLOSAT"
+    chunk_size : int, optional
+        Maximum number of lines formatted at once, by default cic_chunk_size
+    mute : bool, optional
+        If True, no print is made, by default False
+    """
+    start = epoch_to_astrotime(start_epoch)
+    end = epoch_to_astrotime(end_epoch)
+    with open(f"{path}{spacecraft_name}_QUATERNION.TXT", "w") as f:
+        f.write("\n".join(get_AEM_header(start, end, spacecraft_name=spacecraft_name)))
+        write_cic_data(f, chunks, chunk_size=chunk_size)
+    if not mute:
+        print(f"AEM file exported to {path}{spacecraft_name}_QUATERNION.TXT")
+
+
+def write_OEM_file(
+    epochs, states, path, spacecraft_name="TOLOSAT", chunk_size=cic_chunk_size, mute=False
+):
+    """
+    Export cartesian states of the satellite to an OEM file following the CIC/CCSDS format.
+
+    Parameters
+    ----------
+    epochs : list of float or np.ndarray of shape (n,)
+        Epochs in seconds since J2000
+    states : np.ndarray of shape (n, 6)
+        States in the EME2000/J2000 frame in meters and meters per second
+    path : str
+        Path to the folder where the file will be exported
+    spacecraft_name : str, optional
+        Name of the spacecraft, by default "TOLOSAT"
+    chunk_size : int, optional
+        Maximum number of lines formatted at once, by default cic_chunk_size
+    mute : bool, optional
+        If True, no print is made, by default False
+    """
+    stream_OEM_file(
+        [(epochs, states)],
+        epochs[0],
+        epochs[-1],
+        path,
+        spacecraft_name=spacecraft_name,
+        chunk_size=chunk_size,
+        mute=mute,
+    )
+
+
+def write_AEM_file(
+    epochs,
+    quaternions,
+    path,
+    spacecraft_name="TOLOSAT",
+    chunk_size=cic_chunk_size,
+    mute=False,
+):
+    """
+    Export attitude quaternions of the satellite to an AEM file following the CIC/CCSDS format.
+
+    Parameters
+    ----------
+    epochs : list of float or np.ndarray of shape (n,)
+        Epochs in seconds since J2000
+    quaternions : np.ndarray of shape (n, 4)
+        Quaternions representing the attitude of the spacecraft with respect to the EME2000/J2000 frame
+    path : str
+        Path to the folder where the file will be exported
+    spacecraft_name : str, optional
+        Name of the spacecraft, by default "TOLOSAT"
+    chunk_size : int, optional
+        Maximum number of lines formatted at once, by default cic_chunk_size
+    mute : bool, optional
+        If True, no print is made, by default False
+    """
+    stream_AEM_file(
+        [(epochs, quaternions)],
+        epochs[0],
+        epochs[-1],
+        path,
+        spacecraft_name=spacecraft_name,
+        chunk_size=chunk_size,
+        mute=mute,
+    )
+
+
+def read_cic_header(file_path):
+    """
+    Read the header of a CIC file, up to the META_STOP line
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the CIC file
+
+    Returns
+    -------
+    header : dict
+        Keywords of the header and their values, as strings
+    header_length : int
+        Number of lines of the header, i.e. index of the first line of the data block
+    """
+    header = {}
+    with open(file_path, "r") as f:
+        for header_length, line in enumerate(f, start=1):
+            line = line.strip()
+            if line == "META_STOP":
+                return header, header_length
+            if "=" in line:
+                keyword, value = line.split("=", 1)
+                header[keyword.strip()] = value.strip()
+    raise ValueError(f"No META_STOP line found in {file_path}")
+
+
+def read_cic_data(file_path, chunk_size=None, memory_map=False):
+    """
+    Read the data block of a CIC file into arrays, converting the dates to epochs
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the CIC file
+    chunk_size : int, optional
+        If given, the data is read chunk_size lines at a time and a generator of chunks is returned, by default None
+    memory_map : bool, optional
+        If True, the file is memory-mapped instead of being read in a buffer, by default False
+
+    Returns
+    -------
+    epochs : np.ndarray of shape (n,)
+        Epochs in seconds since J2000
+    values : np.ndarray of shape (n, m)
+        Values written after the dates, in the units of the file
+    or, if chunk_size is given,
+    chunks : generator of tuple of np.ndarray
+        Chunks of (epochs, values) of at most chunk_size lines
+    """
+    header, header_length = read_cic_header(file_path)
+    time_scale = header.get("TIME_SYSTEM", "TAI")
+    data = pd.read_csv(
+        file_path,
+        sep=r"\s+",
+        header=None,
+        skiprows=header_length,
+        dtype={0: np.int64},
+        chunksize=chunk_size,
+        memory_map=memory_map,
+    )
+
+    def to_arrays(dataframe):
+        epochs = CIC_days_secs_to_epochs(
+            dataframe[0].to_numpy(), dataframe[1].to_numpy(), time_scale
+        )
+        return epochs, dataframe.iloc[:, 2:].to_numpy(dtype=np.float64)
+
+    if chunk_size is None:
+        return to_arrays(data)
+    return (to_arrays(chunk) for chunk in data)
+
+
+def read_OEM_file(file_path, chunk_size=None, memory_map=False):
+    """
+    Read cartesian states from an OEM file following the CIC/CCSDS format
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the OEM file, for instance "cic_files/TOLOSAT_POSITION_VELOCITY.TXT"
+    chunk_size : int, optional
+        If given, the data is read chunk_size lines at a time and a generator of chunks is returned, by default None
+    memory_map : bool, optional
+        If True, the file is memory-mapped instead of being read in a buffer, by default False
+
+    Returns
+    -------
+    epochs : np.ndarray of shape (n,)
+        Epochs in seconds since J2000
+    states : np.ndarray of shape (n, 6)
+        States in the EME2000/J2000 frame in meters and meters per second
+    or, if chunk_size is given,
+    chunks : generator of tuple of np.ndarray
+        Chunks of (epochs, states) of at most chunk_size lines, which can be given to stream_OEM_file
+    """
+    data = read_cic_data(file_path, chunk_size=chunk_size, memory_map=memory_map)
+    if chunk_size is None:
+        epochs, states = data
+        return epochs, states * 1e3
+    return ((epochs, states * 1e3) for epochs, states in data)
+
+
+def read_AEM_file(file_path, chunk_size=None, memory_map=False):
+    """
+    Read attitude quaternions from an AEM file following the CIC/CCSDS format
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the AEM file, for instance "cic_files/TOLOSAT_QUATERNION.TXT"
+    chunk_size : int, optional
+        If given, the data is read chunk_size lines at a time and a generator of chunks is returned, by default None
+    memory_map : bool, optional
+        If True, the file is memory-mapped instead of being read in a buffer, by default False
+
+    Returns
+    -------
+    epochs : np.ndarray of shape (n,)
+        Epochs in seconds since J2000
+    quaternions : np.ndarray of shape (n, 4)
+        Quaternions representing the attitude of the spacecraft with respect to the EME2000/J2000 frame
+    or, if chunk_size is given,
+    chunks : generator of tuple of np.ndarray
+        Chunks of (epochs, quaternions) of at most chunk_size lines, which can be given to stream_AEM_file
+    """
+    return read_cic_data(file_path, chunk_size=chunk_size, memory_map=memory_map)
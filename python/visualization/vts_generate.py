@@ -54,10 +54,7 @@ def generate_vts_file(
         spacecraft_names = ["TOLOSAT"]
     absolute_path = path.abspath(getcwd())
     vts_file_path = f"{absolute_path}\\{vts_file_name}"
-    days, seconds = epochs_to_CIC_days_secs(epochs)
-    seconds = (
-        np.array(seconds) - 37
-    )  # TODO: Improve this to proper time system conversion
+    days, seconds = epochs_to_CIC_days_secs(epochs, time_scale="UTC")
     start_date_time = f"{days[0]} {seconds[0]:.6f}"
     end_date_time = f"{days[-1]} {seconds[-1]:.6f}"
 